@@ -1,149 +1,461 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
 from flask_cors import CORS
 from datetime import datetime
-from generators.rule_based import RuleBasedGenerator
-from generators.statistical import StatisticalGenerator
-from generators.agent_based import AgentBasedGenerator
-from generators.model_based import ModelBasedGenerator
+from itertools import chain
+from config import (
+    OUTPUT_DIR, CHUNK_SIZE, JOB_WORKERS, MAX_PENDING_JOBS, JOB_DIR, PRELOAD_MODELS,
+    SHARD_WORKERS, MAX_SHARD_WORKERS, RESULT_CACHE_DIR, OUTPUT_MAX_BYTES, OUTPUT_MAX_FILES,
+    OUTPUT_MIN_AGE_SECONDS, MAX_BATCH_SPECS, JOB_MAX_AGE_SECONDS
+)
+from generators.model_registry import default_registry
+from generators.seeding import resolve_seed
+from instrumentation import Metrics, StageTimer, profile_summary, profiled
+from jobs import JobCancelled, JobQueue, LocalJobStore, QueueFull, progress
+from result_cache import ResultCache, cache_key
+from readers import iter_pages
+from tasks import GENERATOR_CLASSES, get_generator, iter_archive, iter_batch_archive, preview_stats, shard_mapper
+from writers import FORMATS, iter_encoded, validate_format
+import cProfile
+import json
 import os
-import pandas as pd
-from zipfile import ZipFile
-import shutil
+import re
+import time
 
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Job-Id'])
 
 # Ensure generated_data directory exists
-os.makedirs('static/generated_data', exist_ok=True)
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+# Models listed in PRELOAD_MODELS are loaded before the worker pool forks, so
+# workers share them; everything else is loaded on first use
+default_registry.preload(PRELOAD_MODELS)
+
+# Seeded results are reused; the output directory is kept within its limits
+result_cache = ResultCache(OUTPUT_DIR, RESULT_CACHE_DIR, max_bytes=OUTPUT_MAX_BYTES,
+                           max_files=OUTPUT_MAX_FILES, min_age=OUTPUT_MIN_AGE_SECONDS)
+result_cache.evict()
+
+# Latency, per-stage time and row counts, exposed at /metrics
+metrics = Metrics()
+
+# Generation runs on a process pool; job state lives on the local filesystem
+job_queue = JobQueue(LocalJobStore(JOB_DIR), max_workers=JOB_WORKERS, max_pending=MAX_PENDING_JOBS,
+                     on_complete=result_cache.store_job,
+                     on_finish=lambda job: metrics.record_generation(job['method'], job['status'], job.get('timings')),
+                     max_held=MAX_BATCH_SPECS, max_age=JOB_MAX_AGE_SECONDS)
+job_queue.expire()
+
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'csv.gz': 'application/gzip',
+    'csv.zst': 'application/zstd',
+    'parquet': 'application/vnd.apache.parquet',
+    'feather': 'application/vnd.apache.arrow.file',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rows per page when streaming a stored dataset
+PAGE_ROWS = 10_000
+
+# Names of datasets in a batch, used as their file names in the batch archive
+BATCH_NAME = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.-]{0,99}')
+
+
+def _stream_response(body, filename, mimetype, job_id=None, attachment=True):
+    """Stream an iterator of bytes to the client."""
+    headers = {}
+    if attachment:
+        headers['Content-Disposition'] = f'attachment; filename={filename}'
+    if job_id:
+        headers['X-Job-Id'] = job_id
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+
+def _instrumented(body, job_id, method, stage, timer, profiler=None):
+    """
+    Pass a streamed response body through, timing its encoding as `stage` (and
+    profiling it, if asked); the job record and metrics are updated when it ends.
+    """
+    status = 'completed'
+    try:
+        yield from timer.timed(profiled(body, profiler) if profiler else body, stage)
+    except (GeneratorExit, JobCancelled):
+        status = 'cancelled'
+        raise
+    except Exception:
+        status = 'failed'
+        raise
+    finally:
+        timings = timer.result()
+        fields = {'timings': timings}
+        if profiler:
+            fields['profile'] = profile_summary(profiler)
+        job_queue.store.update(job_id, **fields)
+        metrics.record_generation(method, status, timings)
+        metrics.record_request(method, 'stream', timings['total_seconds'])
+
+
+def _output_version(method, params):
+    """
+    What besides the request determines the output: the schema of the schema
+    and rule methods, and the model file of the model method.
+    """
+    if method in ('rule', 'schema'):
+        return get_generator(method).get_schema(params).fingerprint
+    if method != 'model':
+        return None
+    path = default_registry.paths.get(params.get('model') or get_generator(method).model_name)
+    if path is None or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [path, stat.st_size, stat.st_mtime_ns]
+
+
+def _parse_request(method, data):
+    """
+    The settings of a /generate request body, or of one batch spec:
+    (rows, params, chunk_size, fmt, workers, seeded). params get a fixed
+    seed; raises ValueError if anything is invalid.
+    """
+    if method not in GENERATOR_CLASSES:
+        raise ValueError('Invalid method')
+    rows = int(data.get('rows', 1000))
+    params = data.get('params', {})
+    chunk_size = int(data.get('chunkSize', CHUNK_SIZE))
+    fmt = data.get('format', 'csv')
+    workers = int(data.get('workers', SHARD_WORKERS))
+    if rows < 1:
+        raise ValueError('rows must be positive')
+    if chunk_size < 1:
+        raise ValueError('chunkSize must be positive')
+    if not 1 <= workers <= MAX_SHARD_WORKERS:
+        raise ValueError(f'workers must be between 1 and {MAX_SHARD_WORKERS}')
+    validate_format(fmt)
+
+    # Only requests that name their seed are reproducible, and so cacheable
+    seeded = params.get('seed') is not None
+    # Fix the seed now so the job record says how to reproduce the output
+    params = {**params, 'seed': resolve_seed(params)}
+    if method == 'schema':
+        # Compile the schema and check its params here rather than in a worker
+        get_generator(method).get_schema(params).bind(params)
+    if method == 'agent' and get_generator(method).windowed(params):
+        get_generator(method).timeseries_plan(rows, params)
+    return rows, params, chunk_size, fmt, workers, seeded
+
+
+def _job_response(job):
+    return {**job, 'progress': progress(job)}
 
-# Initialize generators
-rule_generator = RuleBasedGenerator()
-statistical_generator = StatisticalGenerator()
-agent_generator = AgentBasedGenerator()
-model_generator = ModelBasedGenerator()
 
 @app.route('/generate/<method>', methods=['POST'])
 def generate_data(method):
     try:
+        started = time.perf_counter()
+        # ?profile=1 adds a cProfile summary to the job record (also at /jobs/<id>/profile)
+        profile = request.args.get('profile', '0').lower() in ('1', 'true')
         data = request.get_json()
-        rows = data.get('rows', 1000)
-        params = data.get('params', {})
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-
-        if method == 'rule':
-            df = rule_generator.generate_data(rows, params)
-            filename = f"rule_based_{timestamp}.csv"
-            filepath = os.path.join('static/generated_data', filename)
-            df.to_csv(filepath, index=False)
-            
-            # Create preview data
-            preview_data = {
-                'state_distribution': df['state'].value_counts().to_dict(),
-                'age_distribution': df['age'].value_counts().to_dict(),
-                'occupation_distribution': df['occupation'].value_counts().to_dict()
-            }
-            
-            return jsonify({
-                'status': 'success',
-                'file': filename,
-                'preview_data': preview_data,
-                'rows': rows
-            })
-
-        elif method == 'statistical':
-            df = statistical_generator.generate_data(rows, params)
-            filename = f"statistical_{timestamp}.csv"
-            filepath = os.path.join('static/generated_data', filename)
-            df.to_csv(filepath, index=False)
-            
-            # Create height ranges for preview
-            df['height_range'] = pd.cut(df['height'], bins=10).astype(str)
-            preview_data = {
-                'height_distribution': df['height_range'].value_counts().to_dict(),
-                'sex_distribution': df['sex'].value_counts().to_dict()
-            }
-            
-            return jsonify({
-                'status': 'success',
-                'file': filename,
-                'preview_data': preview_data,
-                'rows': rows
-            })
+        stream = bool(data.get('stream', False))
+        try:
+            rows, params, chunk_size, fmt, workers, seeded = _parse_request(method, data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        elif method == 'agent':
-            df_patients, df_staff, df_resources = agent_generator.generate_data(rows, params)
-            
-            # Create preview data
-            preview_data = {
-                'triage_distribution': df_patients['triage_level'].value_counts().to_dict(),
-                'disposition_distribution': df_patients['disposition'].value_counts().to_dict(),
-                'resource_usage': df_resources['resource_id'].value_counts().to_dict()
-            }
-            
-            # Save files
+        if stream:
+            # Streamed straight to the client from the request thread, through
+            # the same seeded shards as a job
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            files = {
-                'patients': f"ed_patients_{timestamp}.csv",
-                'staff': f"ed_staff_{timestamp}.csv",
-                'resources': f"ed_resources_{timestamp}.csv"
-            }
-            
-            zip_filename = f'ed_simulation_{timestamp}.zip'
-            zip_filepath = os.path.join('static/generated_data', zip_filename)
-            
-            with ZipFile(zip_filepath, 'w') as zipf:
-                for key, filename in files.items():
-                    filepath = os.path.join('static/generated_data', filename)
-                    if key == 'patients':
-                        df_patients.to_csv(filepath, index=False)
-                    elif key == 'staff':
-                        df_staff.to_csv(filepath, index=False)
-                    else:
-                        df_resources.to_csv(filepath, index=False)
-                    zipf.write(filepath, filename)
-                    os.remove(filepath)
-            
-            return jsonify({
-                'status': 'success',
-                'file': zip_filename,
-                'preview_data': preview_data,
-                'rows': rows
-            })
+            timer = StageTimer()
+            chunks = timer.timed(get_generator(method).iter_chunks(rows, params, chunk_size, shard_mapper(method)),
+                                 'generate')
+            # Progress and the preview are recorded under the X-Job-Id header's job
+            job, chunks = job_queue.track_stream(method, rows, params, fmt, chunks, preview_stats(method, params),
+                                                 count_table='patients' if method == 'agent' else None,
+                                                 timer=timer, profile=profile)
+            profiler = cProfile.Profile() if profile else None
+            if method == 'agent':
+                # The archive is assembled on the fly, entry by entry; timeseries
+                # runs checkpoint each window, so an interrupted stream can be resumed
+                windowed = get_generator(method).windowed(params)
+                archive = iter_archive(chunks, fmt, timestamp, windowed, job_queue.checkpointer(job['id']))
+                body = _instrumented(archive, job['id'], method, 'archive', timer, profiler)
+                return _stream_response(body, f"ed_simulation_{timestamp}.zip", 'application/zip', job['id'])
+            body = _instrumented(iter_encoded(chunks, fmt), job['id'], method, 'write', timer, profiler)
+            return _stream_response(body, f"{method}_{timestamp}{FORMATS[fmt]}", MIMETYPES[fmt], job['id'])
 
-        elif method == 'model':
-            df = model_generator.generate_data(rows, params)
-            filename = f"neo_data_{timestamp}.csv"
-            filepath = os.path.join('static/generated_data', filename)
-            df.to_csv(filepath, index=False)
-            
-            preview_data = {
-                'hazard_distribution': df['Hazardous'].value_counts().to_dict()
-            }
-            
+        # A profiled request always runs, so that there is something to profile
+        key = None
+        if seeded and not profile:
+            key = cache_key(method, rows, params, chunk_size, fmt, _output_version(method, params))
+        entry = result_cache.get(key) if key else None
+        if entry is not None:
+            job = job_queue.record_cached(method, params, fmt, entry)
+            metrics.record_request(method, 'cached', time.perf_counter() - started)
             return jsonify({
-                'status': 'success',
-                'file': filename,
-                'preview_data': preview_data,
-                'rows': rows
+                'status': 'completed',
+                'job_id': job['id'],
+                'rows': entry['rows'],
+                'seed': params['seed'],
+                'cached': True
             })
 
-        else:
-            return jsonify({'error': 'Invalid method'}), 400
+        job = job_queue.submit(method, rows, params, chunk_size, fmt, workers, cache_key=key, profile=profile)
+        metrics.record_request(method, 'job', time.perf_counter() - started)
+        return jsonify({
+            'status': 'queued',
+            'job_id': job['id'],
+            'rows': rows,
+            'seed': params['seed']
+        }), 202
+
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/batch', methods=['POST'])
+def generate_batch():
+    """
+    Generate several datasets at once from {"specs": [...]}, each spec a
+    /generate request body plus its "method" and an optional "name".
+    Identical specs are generated once, seeded ones are answered from the
+    result cache where possible, and the rest run in parallel as jobs. The
+    manifest is at /batches/<id>, and every dataset in one archive at
+    /batches/<id>/archive.
+    """
+    try:
+        started = time.perf_counter()
+        specs = (request.get_json() or {}).get('specs')
+        if not isinstance(specs, list) or not specs:
+            return jsonify({'error': 'specs must be a non-empty list'}), 400
+        if len(specs) > MAX_BATCH_SPECS:
+            return jsonify({'error': f'At most {MAX_BATCH_SPECS} specs per batch'}), 400
+
+        items = []
+        first_index = {}
+        for index, spec in enumerate(specs):
+            if not isinstance(spec, dict):
+                return jsonify({'error': f'specs[{index}] must be an object'}), 400
+            method = spec.get('method')
+            name = str(spec.get('name', f"{index + 1:03d}_{method}"))
+            if not BATCH_NAME.fullmatch(name):
+                return jsonify({'error': f'specs[{index}]: invalid name {name!r}'}), 400
+            if any(item['name'] == name for item in items):
+                return jsonify({'error': f'specs[{index}]: duplicate name {name!r}'}), 400
+
+            # Specs that only differ in name are generated once, unseeded ones included
+            identity = json.dumps({k: v for k, v in spec.items() if k != 'name'}, sort_keys=True, default=str)
+            if identity in first_index:
+                items.append({'name': name, 'duplicate_of': first_index[identity]})
+                continue
+            first_index[identity] = index
+
+            try:
+                rows, params, chunk_size, fmt, workers, seeded = _parse_request(method, spec)
+            except ValueError as e:
+                return jsonify({'error': f'specs[{index}]: {e}'}), 400
+            key = cache_key(method, rows, params, chunk_size, fmt, _output_version(method, params)) if seeded else None
+            item = {'name': name, 'method': method, 'rows': rows, 'params': params, 'chunk_size': chunk_size,
+                    'format': fmt, 'workers': workers, 'cache_key': key}
+            entry = result_cache.get(key) if key else None
+            if entry is not None:
+                item['job_id'] = job_queue.record_cached(method, params, fmt, entry)['id']
+            items.append(item)
+
+        batch = job_queue.submit_batch(items)
+        metrics.record_request('batch', 'job', time.perf_counter() - started)
+        return jsonify(job_queue.get_batch(batch['id'])), 202
+
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/batches/<batch_id>', methods=['GET'])
+def batch_status(batch_id):
+    try:
+        batch = job_queue.get_batch(batch_id)
+        if batch is None:
+            return jsonify({'error': 'Batch not found'}), 404
+        return jsonify(batch)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/batches/<batch_id>', methods=['DELETE'])
+def cancel_batch(batch_id):
+    try:
+        batch = job_queue.cancel_batch(batch_id)
+        if batch is None:
+            return jsonify({'error': 'Batch not found'}), 404
+        return jsonify(batch)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/batches/<batch_id>/archive', methods=['GET'])
+def batch_archive(batch_id):
+    """The batch's completed datasets and its manifest, as one zip archive."""
+    try:
+        batch = job_queue.get_batch(batch_id)
+        if batch is None:
+            return jsonify({'error': 'Batch not found'}), 404
+        if batch['status'] in ('queued', 'running'):
+            return jsonify({'error': f"Batch is {batch['status']}"}), 409
+
+        members = {}
+        for entry in batch['items']:
+            if entry['path'] is None or entry['path'] in members:
+                continue
+            filepath = os.path.join(OUTPUT_DIR, entry['file'])
+            if not os.path.exists(filepath):
+                return jsonify({'error': f"Output of {entry['name']} is no longer available"}), 410
+            result_cache.touch(entry['file'])
+            members[entry['path']] = (entry['path'], filepath, entry['format'])
+
+        body = iter_batch_archive(batch, list(members.values()))
+        return _stream_response(body, f"batch_{batch_id[:8]}.zip", 'application/zip')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(_job_response(job))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    try:
+        job = job_queue.cancel(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(_job_response(job))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Continue a cancelled or failed timeseries job (streamed or not) from its last completed window."""
+    try:
+        job = job_queue.resume(job_id, CHUNK_SIZE)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({
+            'status': 'queued',
+            'job_id': job['id'],
+            'resumed_from': job['resumed_from']
+        }), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        if job['status'] != 'completed':
+            return jsonify({'error': f"Job is {job['status']}"}), 409
+        return download_file(job['file'])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
+@app.route('/jobs/<job_id>/profile', methods=['GET'])
+def job_profile(job_id):
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        if not job.get('profiled'):
+            return jsonify({'error': 'Job was not profiled; request it with ?profile=1'}), 404
+        if not job.get('profile'):
+            return jsonify({'error': f"Job is {job['status']}"}), 409
+        return Response(job['profile'], mimetype='text/plain')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    try:
+        cache = result_cache.metrics()
+        gauges = {
+            'datagen_output_bytes': ('Size of the generated files kept', cache['bytes']),
+            'datagen_output_files': ('Number of generated files kept', cache['files']),
+            'datagen_result_cache_entries': ('Cached seeded results', cache['entries']),
+        }
+        return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/cache/metrics', methods=['GET'])
+def cache_metrics():
+    try:
+        return jsonify(result_cache.metrics())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/download/<filename>', methods=['GET'])
 def download_file(filename):
     try:
-        return send_file(
-            os.path.join('static/generated_data', filename),
+        # Downloads count as use for eviction
+        result_cache.touch(filename)
+        # Conditional responses support Range/If-Range (resumable downloads),
+        # ETag/If-None-Match and Last-Modified
+        return send_from_directory(
+            os.path.abspath(OUTPUT_DIR),
+            filename,
             as_attachment=True,
-            download_name=filename
+            download_name=filename,
+            conditional=True,
+            etag=True
         )
+    except NotFound:
+        return jsonify({'error': 'File not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/download/<filename>/rows', methods=['GET'])
+def download_rows(filename):
+    """
+    Stream rows of a generated dataset as NDJSON (default) or CSV, page by
+    page, e.g. ?offset=1000&limit=500. Archives take ?table=patients|staff|resources.
+    """
+    try:
+        fmt = request.args.get('format', 'ndjson')
+        offset = int(request.args.get('offset', 0))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit is not None else None
+        if fmt not in ('ndjson', 'csv'):
+            return jsonify({'error': 'format must be ndjson or csv'}), 400
+        if offset < 0 or (limit is not None and limit < 0):
+            return jsonify({'error': 'offset and limit must not be negative'}), 400
+
+        path = safe_join(os.path.abspath(OUTPUT_DIR), filename)
+        if path is None or not os.path.isfile(path):
+            return jsonify({'error': 'File not found'}), 404
+        result_cache.touch(filename)
+
+        pages = iter_pages(path, offset, limit, PAGE_ROWS, table=request.args.get('table'))
+        # Fail before the response starts if the file or table cannot be read
+        first = next(pages, None)
+        body = iter_encoded(chain([first] if first is not None else [], pages), fmt)
+        return _stream_response(body, filename, MIMETYPES[fmt], attachment=False)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    app.run(debug=True, port=5000)
@@ -0,0 +1,289 @@
+"""
+Benchmarks for every generator, directly and through the HTTP API.
+
+Run from the backend directory:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json   # exit status 1 on a regression
+
+Every case runs in a fresh interpreter so peak RSS is per case. The model
+generator uses a pickled StubNEOModel in place of the CTGAN model.
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import pickle
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+METHODS = ('rule', 'statistical', 'agent', 'model')
+PATHS = ('generator', 'http')
+SIZES = (1_000, 100_000, 1_000_000)
+
+CASE_PARAMS = {
+    'rule': {'seed': 0},
+    'statistical': {'seed': 0},
+    'agent': {'seed': 0},
+    'model': {'seed': 0, 'model': 'stub', 'objectType': 'hazardous'},
+}
+
+# A case regresses when it is this much slower, or uses this much more memory
+DEFAULT_THRESHOLD = 0.15
+
+
+def _peak_rss_bytes(who=resource.RUSAGE_SELF):
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _gc_collections():
+    return sum(stats['collections'] for stats in gc.get_stats())
+
+
+def _generator_case(method, rows):
+    from config import CHUNK_SIZE
+    from tasks import get_generator
+
+    # Built outside the timed runs, as the app keeps one per process
+    generator = get_generator(method)
+    params = CASE_PARAMS[method]
+
+    def run():
+        produced = 0
+        for item in generator.iter_chunks(rows, params, CHUNK_SIZE):
+            if method == 'agent':
+                table, item = item
+                if table != 'patients':
+                    continue
+            produced += len(item)
+        return produced
+
+    return run, None
+
+
+def _http_case(method, rows):
+    from app import app, job_queue
+    from tasks import get_generator
+
+    # A running server already holds its generators; jobs build theirs in the workers
+    get_generator(method)
+    client = app.test_client()
+    # Seeded requests are answered from the result cache once generated, so
+    # every run asks for a seed of its own
+    seeds = itertools.count(CASE_PARAMS[method]['seed'])
+
+    def run():
+        body = {'rows': rows, 'params': {**CASE_PARAMS[method], 'seed': next(seeds)}, 'format': 'csv'}
+        if method != 'agent':
+            response = client.post(f'/generate/{method}', json={**body, 'stream': True})
+            if response.status_code != 200:
+                raise RuntimeError(f"/generate/{method} returned {response.status_code}: {response.get_data(as_text=True)}")
+            for _ in response.response:
+                pass
+            return rows
+
+        # Archives are only produced as background jobs
+        response = client.post(f'/generate/{method}', json=body)
+        if response.status_code != 202:
+            raise RuntimeError(f"/generate/{method} returned {response.status_code}: {response.get_data(as_text=True)}")
+        job_id = response.get_json()['job_id']
+        while True:
+            job = client.get(f'/jobs/{job_id}').get_json()
+            if job['status'] == 'completed':
+                return job['rows_done']
+            if job['status'] in ('failed', 'cancelled'):
+                raise RuntimeError(f"Job {job_id} {job['status']}: {job.get('error')}")
+            time.sleep(0.02)
+
+    def close():
+        job_queue.executor.shutdown(wait=True)
+
+    return run, close
+
+
+def run_case(method, path, rows, repeat=1, trace=True):
+    """Time one case in this process and return its result record."""
+    run, close = (_generator_case if path == 'generator' else _http_case)(method, rows)
+
+    timings = []
+    collections = _gc_collections()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        produced = run()
+        timings.append(time.perf_counter() - start)
+    collections = (_gc_collections() - collections) / repeat
+    peak_rss = _peak_rss_bytes()
+
+    # Separate run: tracing slows allocation-heavy code down several times.
+    # Only this process is traced, not job workers.
+    traced_peak = None
+    if trace:
+        tracemalloc.start()
+        run()
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    if close:
+        # Children only count towards RUSAGE_CHILDREN once they have exited
+        close()
+        peak_rss = max(peak_rss, _peak_rss_bytes(resource.RUSAGE_CHILDREN))
+
+    best = min(timings)
+    return {
+        'method': method,
+        'path': path,
+        'rows': rows,
+        'produced': produced,
+        'seconds': round(best, 4),
+        'rows_per_sec': round(produced / best, 1) if best else None,
+        'peak_rss_bytes': peak_rss,
+        'traced_peak_bytes': traced_peak,
+        'gc_collections': collections,
+        'repeat': repeat,
+    }
+
+
+def _case_subprocess(method, path, rows, repeat, trace, env):
+    command = [sys.executable, '-m', 'benchmarks.run', '--case', f'{method}:{path}:{rows}', '--repeat', str(repeat)]
+    if not trace:
+        command.append('--no-trace')
+    completed = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark {method}/{path}/{rows} failed:\n{completed.stderr}")
+    # Generators may print; the record is always the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(methods, paths, sizes, repeat=1, trace=True, log=sys.stderr):
+    with tempfile.TemporaryDirectory() as workdir:
+        from benchmarks.stub_model import StubNEOModel
+
+        stub_path = os.path.join(workdir, 'stub_model.pkl')
+        with open(stub_path, 'wb') as f:
+            pickle.dump(StubNEOModel(), f)
+        output_dir = os.path.join(workdir, 'generated_data')
+        os.makedirs(output_dir)
+        env = {
+            **os.environ,
+            'OUTPUT_DIR': output_dir,
+            'JOB_DIR': os.path.join(workdir, 'jobs'),
+            'RESULT_CACHE_DIR': os.path.join(workdir, 'result_cache'),
+            'MODEL_PATHS': f'stub={stub_path}',
+            'PRELOAD_MODELS': '',
+        }
+
+        results = []
+        for method in methods:
+            for path in paths:
+                for rows in sizes:
+                    record = _case_subprocess(method, path, rows, repeat, trace, env)
+                    print(f"{method:12} {path:9} {rows:>9,} rows  {record['seconds']:9.3f}s  "
+                          f"{record['rows_per_sec']:>12,.0f} rows/s  "
+                          f"{record['peak_rss_bytes'] / 2 ** 20:8.1f} MiB", file=log)
+                    results.append(record)
+
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD, log=sys.stderr):
+    """Print current vs. baseline per case and return the regressed cases."""
+    def key(record):
+        return record['method'], record['path'], record['rows']
+
+    base = {key(record): record for record in baseline['results']}
+    regressions = []
+    for record in current['results']:
+        label = '/'.join(str(part) for part in key(record))
+        previous = base.get(key(record))
+        if previous is None:
+            print(f"{label:32} new case", file=log)
+            continue
+
+        speed = record['rows_per_sec'] / previous['rows_per_sec']
+        memory = record['peak_rss_bytes'] / previous['peak_rss_bytes']
+        regressed = speed < 1 - threshold or memory > 1 + threshold
+        print(f"{label:32} speed x{speed:5.2f}  memory x{memory:5.2f}{'  REGRESSION' if regressed else ''}",
+              file=log)
+        if regressed:
+            regressions.append({'case': label, 'speed_ratio': round(speed, 3), 'memory_ratio': round(memory, 3)})
+    return regressions
+
+
+def _csv_list(value, cast=str):
+    return [cast(item) for item in value.split(',') if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--methods', type=_csv_list, default=list(METHODS))
+    parser.add_argument('--paths', type=_csv_list, default=list(PATHS))
+    parser.add_argument('--sizes', type=lambda v: _csv_list(v, int), default=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case; the best is kept')
+    parser.add_argument('--no-trace', dest='trace', action='store_false', help='skip the tracemalloc run')
+    parser.add_argument('--output', help='write results JSON here instead of stdout')
+    parser.add_argument('--compare', metavar='BASELINE', help='compare against a previous results file')
+    parser.add_argument('--current', metavar='RESULTS', help='compare this results file instead of running')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        method, path, rows = args.case.split(':')
+        print(json.dumps(run_case(method, path, int(rows), args.repeat, args.trace)))
+        return 0
+
+    for name, values, allowed in (('methods', args.methods, METHODS), ('paths', args.paths, PATHS)):
+        unknown = set(values) - set(allowed)
+        if unknown:
+            parser.error(f"unknown {name}: {', '.join(sorted(unknown))}")
+
+    if args.current:
+        with open(args.current) as f:
+            results = json.load(f)
+    else:
+        results = run_suite(args.methods, args.paths, args.sizes, args.repeat, args.trace)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        results['regressions'] = compare(results, baseline, args.threshold)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    elif not args.current:
+        print(json.dumps(results, indent=2))
+
+    return 1 if results.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
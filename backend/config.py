@@ -0,0 +1,53 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Directory where generated datasets are written and served from
+OUTPUT_DIR = os.getenv('OUTPUT_DIR', 'static/generated_data')
+
+# Rows generated and written per chunk; bounds peak memory of a request
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 100_000))
+
+# Background job queue: worker processes, maximum queued + running jobs, and
+# where job records are kept (local filesystem, no broker required)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', os.cpu_count() or 2))
+MAX_PENDING_JOBS = int(os.getenv('MAX_PENDING_JOBS', 32))
+JOB_DIR = os.getenv('JOB_DIR', 'job_data')
+# Finished job records (with their checkpoints) are deleted after this long
+JOB_MAX_AGE_SECONDS = int(os.getenv('JOB_MAX_AGE_SECONDS', 7 * 24 * 3600))
+
+# Most generation specs accepted in one /batch request, and batch jobs held
+# until the job queue has room for them
+MAX_BATCH_SPECS = int(os.getenv('MAX_BATCH_SPECS', 100))
+
+# Processes each job may use to generate its shards in parallel, by default
+# and at most; output for a given seed does not depend on this
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', 1))
+MAX_SHARD_WORKERS = int(os.getenv('MAX_SHARD_WORKERS', os.cpu_count() or 2))
+
+# Result cache for seeded requests, and the limits that generated files are
+# evicted to (least recently used first; files newer than the minimum age are kept)
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', 'result_cache')
+OUTPUT_MAX_BYTES = int(os.getenv('OUTPUT_MAX_BYTES', 5 * 1024 ** 3))
+OUTPUT_MAX_FILES = int(os.getenv('OUTPUT_MAX_FILES', 1000))
+OUTPUT_MIN_AGE_SECONDS = int(os.getenv('OUTPUT_MIN_AGE_SECONDS', 300))
+
+# Declarative dataset schemas (JSON or YAML) for the schema method; the
+# built-in customer_profile schema defines the rule method
+SCHEMA_DIR = os.getenv('SCHEMA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas'))
+
+# Memory an archive may use to buffer a table before spilling it to disk
+SPOOL_MAX_BYTES = int(os.getenv('SPOOL_MAX_BYTES', 256 * 1024 * 1024))
+
+# Generative models: name -> file, as "name=path" pairs separated by commas.
+# "ctgan" defaults to CTGAN_MODEL_PATH.
+CTGAN_MODEL_PATH = os.getenv('CTGAN_MODEL_PATH', 'C:/Users/HP BITTU/Downloads/ctgan_model.pkl')
+MODEL_PATHS = {'ctgan': CTGAN_MODEL_PATH}
+MODEL_PATHS.update(
+    pair.split('=', 1) for pair in os.getenv('MODEL_PATHS', '').split(',') if '=' in pair
+)
+# Loaded-model cache limits, and models to load before worker processes fork
+MODEL_CACHE_BYTES = int(os.getenv('MODEL_CACHE_BYTES', 2 * 1024 ** 3))
+MODEL_CACHE_SIZE = int(os.getenv('MODEL_CACHE_SIZE', 4))
+PRELOAD_MODELS = [name for name in os.getenv('PRELOAD_MODELS', '').split(',') if name]
@@ -1,8 +1,32 @@
+import math
+import pickle
 import numpy as np
 import pandas as pd
-import random
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+from generators.arrivals import DEFAULT_HOURLY_PROFILE, DEFAULT_WEEKLY_PROFILE, poisson_arrivals, rate_profile
+from generators.ed_simulation import (
+    EDSimulation, DAY_ROTATION, DAY_SHIFT_START_HOUR, NIGHT_SHIFT_START_HOUR
+)
+from generators.seeding import resolve_seed, stream_rng
+from writers import ID_FORMATS
+
+# Random streams of a seeded run; patient shards use (PATIENT_STREAM, shard index)
+# and the timeseries mode's windows (WINDOW_STREAM, department, window)
+ARRIVAL_COUNT_STREAM = 0
+PATIENT_STREAM = 1
+STAFF_STREAM = 2
+WINDOW_STREAM = 3
+
+# Patient IDs are kept as integers and written as "P0001"
+PATIENT_ID_FORMAT = ("P", 4)
+
+# Output windows of the timeseries mode, in days
+WINDOW_DAYS = {"day": 1, "week": 7}
+# Table name of the (WINDOW_END, checkpoint) pair that closes each output window
+WINDOW_END = "window_end"
+CHECKPOINT_VERSION = 1
 
 class AgentBasedGenerator:
     def __init__(self):
@@ -10,9 +34,6 @@ class AgentBasedGenerator:
         self.SIMULATION_DAYS = 7
         self.END_DATE = self.START_DATE + timedelta(days=self.SIMULATION_DAYS)
         
-        np.random.seed(42)
-        random.seed(42)
-        
         self.staff_roles = ["ER Physician", "ER Nurse", "Physician Assistant"]
         self.bed_ids = [f"EDBed{i}" for i in range(1, 6)]
         self.complaints = [
@@ -21,49 +42,358 @@ class AgentBasedGenerator:
             "General Weakness"
         ]
         self.comorbidities = ["None", "Hypertension", "Diabetes", "Asthma", "COPD"]
+        
+        # Low-cardinality columns are categorical; the simulation only sees their codes
+        conditions = self.comorbidities[1:]
+        self.comorbidity_dtype = pd.CategoricalDtype(
+            ["None"] + conditions + [f"{a}, {b}" for a in conditions for b in conditions if a != b]
+        )
+        self.gender_dtype = pd.CategoricalDtype(["Male", "Female"])
+        self.complaint_dtype = pd.CategoricalDtype(self.complaints)
+        self.disposition_dtype = pd.CategoricalDtype(["Discharged", "Admitted"])
+        self.role_dtype = pd.CategoricalDtype(self.staff_roles)
+        self.bed_dtype = pd.CategoricalDtype(self.bed_ids)
+        self.resource_type_dtype = pd.CategoricalDtype(["ED Bed"])
 
     def generate_data(self, rows: int, params: Optional[Dict] = None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
         try:
-            num_patients = int(rows)  # Convert rows to integer
-            staff_count = int(params.get('staffCount', 10)) if params else 10
-            sim_days = int(params.get('days', 7)) if params else 7
-            
-            # Update simulation duration
-            self.SIMULATION_DAYS = sim_days
-            self.END_DATE = self.START_DATE + timedelta(days=self.SIMULATION_DAYS)
-            
-            # Generate staff IDs
-            staff_ids = [f"S{i+1:03d}" for i in range(staff_count)]
-            
-            # Generate the three datasets
-            df_patients = self._generate_patients(num_patients, staff_ids)
-            df_staff = self._generate_staff(staff_ids)
-            df_resources = self._generate_resource_usage(df_patients)
+            tables = {"patients": [], "staff": [], "resources": []}
+            for table, df in self.iter_chunks(rows, params, chunk_size=max(int(rows), 1)):
+                if table in tables:
+                    tables[table].append(df)
             
+            df_patients, df_staff, df_resources = (
+                pd.concat(tables[name], ignore_index=True) if tables[name] else pd.DataFrame()
+                for name in ("patients", "staff", "resources")
+            )
             return df_patients, df_staff, df_resources
             
         except Exception as e:
             raise Exception(f"Error in generate_data: {str(e)}")
 
-    def _random_timestamp(self, start_dt, end_dt):
-        delta = end_dt - start_dt
-        random_sec = random.randrange(int(delta.total_seconds()))
-        return start_dt + timedelta(seconds=random_sec)
-
-    def _generate_comorbidities(self):
-        if random.random() < 0.3:
-            return "None"
-        selected = random.sample(self.comorbidities[1:], k=random.randint(1,2))
-        return ", ".join(selected)
-
-    def _assign_triage_level(self, chief_complaint):
-        if chief_complaint == "Chest Pain":
-            return np.random.choice([1, 2], p=[0.3, 0.7])
-        elif chief_complaint == "Severe Trauma":
-            return 1
-        return np.random.choice([3, 4, 5], p=[0.4, 0.4, 0.2])
-
-    def _resource_usage_duration(self, triage_level):
+    @staticmethod
+    def windowed(params: Optional[Dict]) -> bool:
+        """Whether a request is for the timeseries mode, see _iter_windows()."""
+        return bool(params) and params.get('mode') == 'timeseries'
+
+    def iter_chunks(self, rows: int, params: Optional[Dict] = None, chunk_size: int = 100_000,
+                    map_shards: Optional[Callable[[Iterable[Dict]], Iterable]] = None,
+                    checkpoint: Optional[Dict] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """
+        Yield (table_name, DataFrame) pairs: the staff table first, then matching
+        patient and resource chunks of at most roughly chunk_size patients each.
+
+        Patient attributes are drawn per time-slice shard, each from its own
+        random stream, and may be produced in parallel through map_shards
+        (default: map over generate_shard); the simulation itself then runs
+        over the shards in order.
+
+        With the `mode` param "timeseries" the output comes window by window
+        instead, and a run can continue from one of its checkpoints; see
+        _iter_windows().
+        """
+        if self.windowed(params):
+            yield from self._iter_windows(rows, params, checkpoint)
+            return
+
+        num_patients = int(rows)  # Convert rows to integer
+        staff_count = int(params.get('staffCount', 10)) if params else 10
+        # The horizon is per request; the generator is shared between requests
+        sim_days = int(params.get('days', self.SIMULATION_DAYS)) if params else self.SIMULATION_DAYS
+        
+        # Generate staff IDs, formatted once per staff member
+        if staff_count < 1:
+            raise ValueError("staffCount must be at least 1")
+        staff_ids = pd.CategoricalDtype([f"S{i+1:03d}" for i in range(staff_count)])
+        
+        # Staff alternate between the day and night rotations
+        staff_rotations = [i % 2 for i in range(staff_count)]
+        
+        seed = resolve_seed(params)
+        yield "staff", self._generate_staff(staff_ids, staff_rotations, sim_days, stream_rng(seed, STAFF_STREAM))
+        
+        # Patients queue for beds and on-shift staff in the event-driven simulation
+        simulation = EDSimulation(len(self.bed_ids), staff_rotations)
+        specs = self._arrival_shards(num_patients, chunk_size, sim_days * 86400, seed)
+        for patients in (map_shards or self._map_shards)(specs):
+            finished = simulation.feed(
+                patients["triage_offset"], patients["triage_level"], patients["treatment_minutes"] * 60,
+                int(patients["arrival_offset"][-1]), payload=patients
+            )
+            for batch in finished:
+                yield from self._finalize_batch(*batch, staff_ids)
+        
+        for batch in simulation.finish():
+            yield from self._finalize_batch(*batch, staff_ids)
+
+    def timeseries_plan(self, rows: int, params: Dict) -> Dict:
+        """
+        The departments, windows and arrival rates of a timeseries request.
+
+        Params: days (horizon), window ("day" or "week"), departments (list of
+        {name, beds, staffCount, weight}; one "ED" department by default),
+        hourlyProfile (24 relative rates from midnight), weeklyProfile (7 from
+        Monday) and ratePerHour, the mean arrivals per hour over all
+        departments; by default, rows arrivals are expected over the horizon.
+        """
+        days = int(params.get('days', 7))
+        if days < 1:
+            raise ValueError("days must be at least 1")
+        window = params.get('window', 'day')
+        if window not in WINDOW_DAYS:
+            raise ValueError(f"window must be one of: {', '.join(WINDOW_DAYS)}")
+        hourly = rate_profile(params.get('hourlyProfile'), DEFAULT_HOURLY_PROFILE, 'hourlyProfile')
+        weekly = rate_profile(params.get('weeklyProfile'), DEFAULT_WEEKLY_PROFILE, 'weeklyProfile')
+
+        departments = params.get('departments') or [{'name': 'ED'}]
+        names = [str(department.get('name', f"ED{i + 1}")) for i, department in enumerate(departments)]
+        if len(set(names)) != len(names):
+            raise ValueError("Department names must be unique")
+        default_staff = int(params.get('staffCount', 10))
+        beds = [int(department.get('beds', len(self.bed_ids))) for department in departments]
+        staff = [int(department.get('staffCount', default_staff)) for department in departments]
+        weights = np.array([float(department.get('weight', 1)) for department in departments])
+        if min(beds) < 1 or min(staff) < 1:
+            raise ValueError("Every department needs at least one bed and one staff member")
+        if not np.all(np.isfinite(weights)) or np.any(weights < 0) or weights.sum() <= 0:
+            raise ValueError("Department weights must be non-negative and not all zero")
+
+        # Arrivals per hour at relative rate 1, split between the departments
+        first_weekday = self.START_DATE.weekday()
+        rate = params.get('ratePerHour')
+        if rate is None:
+            rate = int(rows) / (24 * weekly[(first_weekday + np.arange(days)) % 7].sum())
+        try:
+            rate = float(rate)
+        except (TypeError, ValueError):
+            raise ValueError("ratePerHour must be a number")
+        if not math.isfinite(rate) or rate < 0:
+            raise ValueError("ratePerHour must be a finite, non-negative number")
+        rates = rate * weights / weights.sum()
+
+        # Staff and beds are numbered across departments, staff alternating
+        # between the day and night rotations within each one
+        staff_department = np.repeat(np.arange(len(names)), staff)
+        return {
+            'days': days,
+            'window_days': WINDOW_DAYS[window],
+            'windows': -(-days // WINDOW_DAYS[window]),
+            'first_weekday': first_weekday,
+            'hourly': hourly,
+            'weekly': weekly,
+            'rates': rates,
+            'beds': beds,
+            'bed_offsets': np.cumsum([0] + beds[:-1]),
+            'staff_offsets': np.cumsum([0] + staff[:-1]),
+            'rotations': [[i % 2 for i in range(count)] for count in staff],
+            'department_dtype': pd.CategoricalDtype(names),
+            'bed_dtype': pd.CategoricalDtype(
+                [f"{name}Bed{i}" for name, count in zip(names, beds) for i in range(1, count + 1)]),
+            'staff_ids': pd.CategoricalDtype([f"S{i + 1:03d}" for i in range(sum(staff))]),
+            'staff_department': staff_department,
+            'staff_rotations': np.concatenate([np.arange(count) % 2 for count in staff]),
+        }
+
+    def _iter_windows(self, rows, params, checkpoint=None):
+        """
+        The timeseries mode: a long horizon simulated one window (a day or a
+        week) at a time. Memory is bounded by a window's patients whatever the
+        horizon or number of departments, as long as each department keeps up
+        with its arrivals (an overloaded one's queue grows without bound).
+
+        Arrivals follow a Poisson process whose rate varies by hour of day and
+        day of week, drawn in time order per window and department; each
+        department is its own simulation. For each window, in order, this
+        yields its staff shifts, the patient and resource chunks of the
+        patients who arrived in it (once they have all started treatment),
+        and then (WINDOW_END, checkpoint). Passing that checkpoint back in
+        continues with the next window, exactly as the uninterrupted run would.
+        """
+        plan = self.timeseries_plan(rows, params)
+        seed = resolve_seed(params)
+        roles = stream_rng(seed, STAFF_STREAM).integers(len(self.staff_roles), size=len(plan['staff_ids'].categories))
+        if checkpoint is None:
+            state = {
+                'fed': 0,
+                'emitted': 0,
+                'patients_seen': 0,
+                'rows_done': 0,
+                'simulations': [EDSimulation(beds, rotations) for beds, rotations in zip(plan['beds'], plan['rotations'])],
+                'finished': [deque() for _ in plan['beds']],
+            }
+        else:
+            state = self._restore(checkpoint, plan)
+
+        while state['emitted'] < plan['windows']:
+            if state['fed'] < plan['windows']:
+                self._feed_window(state, plan, seed)
+            else:
+                for simulation, finished in zip(state['simulations'], state['finished']):
+                    finished.extend(simulation.finish())
+
+            # A window is complete once every department has placed its patients
+            while state['emitted'] < plan['windows'] and all(state['finished']):
+                yield from self._window_tables(state, plan, roles)
+                state['emitted'] += 1
+                yield WINDOW_END, self._checkpoint(state, plan)
+
+    def _window_start_day(self, window, plan):
+        return window * plan['window_days']
+
+    def _feed_window(self, state, plan, seed):
+        window = state['fed']
+        first_day = self._window_start_day(window, plan)
+        n_days = min(plan['window_days'], plan['days'] - first_day)
+        hour = np.arange(n_days * 24)
+        relative_rate = plan['hourly'][hour % 24] * plan['weekly'][(plan['first_weekday'] + first_day + hour // 24) % 7]
+        window_start = first_day * 86400
+        window_end = (first_day + n_days) * 86400
+
+        for department, (simulation, finished) in enumerate(zip(state['simulations'], state['finished'])):
+            rng = stream_rng(seed, WINDOW_STREAM, department, window)
+            arrivals = poisson_arrivals(plan['rates'][department] * relative_rate, window_start, rng)
+            patients = self._generate_patients(arrivals, rng, state['patients_seen'])
+            patients["department"] = np.full(len(arrivals), department, dtype=np.int8)
+            state['patients_seen'] += len(arrivals)
+            finished.extend(simulation.feed(
+                patients["triage_offset"], patients["triage_level"], patients["treatment_minutes"] * 60,
+                window_end, payload=patients
+            ))
+        state['fed'] += 1
+
+    def _window_tables(self, state, plan, roles):
+        first_day = self._window_start_day(state['emitted'], plan)
+        n_days = min(plan['window_days'], plan['days'] - first_day)
+        df_staff = self._staff_shifts(plan['staff_ids'], roles, plan['staff_rotations'], first_day, n_days)
+        df_staff.insert(1, "department", pd.Categorical.from_codes(
+            np.repeat(plan['staff_department'], n_days), dtype=plan['department_dtype']))
+        yield "staff", df_staff
+
+        for department, finished in enumerate(state['finished']):
+            patients, start, bed, staff = finished.popleft()
+            state['rows_done'] += len(start)
+            yield from self._finalize_batch(
+                patients, start, bed + plan['bed_offsets'][department], staff + plan['staff_offsets'][department],
+                plan['staff_ids'], plan['bed_dtype'], plan['department_dtype']
+            )
+
+    def _checkpoint(self, state, plan):
+        """
+        A picklable snapshot taken between windows: the simulations mid-run
+        and the patients already placed but not yet written.
+        """
+        window_start = self.START_DATE + timedelta(days=self._window_start_day(state['emitted'] - 1, plan))
+        return {
+            'version': CHECKPOINT_VERSION,
+            'windows_done': state['emitted'],
+            'windows': plan['windows'],
+            'window_start': window_start.strftime('%Y%m%d'),
+            'rows_done': state['rows_done'],
+            'state': pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        }
+
+    def _restore(self, checkpoint, plan):
+        if checkpoint.get('version') != CHECKPOINT_VERSION or checkpoint.get('windows') != plan['windows']:
+            raise ValueError("Checkpoint does not belong to this simulation")
+        state = pickle.loads(checkpoint['state'])
+        if len(state['simulations']) != len(plan['beds']):
+            raise ValueError("Checkpoint does not belong to this simulation")
+        return state
+
+    def _to_datetime(self, offsets: np.ndarray) -> np.ndarray:
+        """Second offsets from START_DATE as datetime64 values, at pandas' default resolution."""
+        return (np.datetime64(self.START_DATE, "s") + offsets.astype("timedelta64[s]")).astype("datetime64[ns]")
+
+    def _finalize_batch(self, patients, start, bed, staff, staff_ids, bed_dtype=None, department_dtype=None):
+        """
+        Build the patient and resource tables for a batch once the simulation
+        has placed it. staff_ids is the CategoricalDtype of the staff IDs;
+        with department_dtype the patients get a department column.
+        """
+        discharge = start + patients["treatment_minutes"] * 60
+        patient_ids = patients["patient_number"]
+        triage_times = self._to_datetime(patients["triage_offset"])
+        start_times = self._to_datetime(start)
+        discharge_times = self._to_datetime(discharge)
+        
+        df_patients = pd.DataFrame({
+            "patient_id": patient_ids,
+            "arrival_time": self._to_datetime(patients["arrival_offset"]),
+            "age": patients["age"].astype(np.int8),
+            "gender": pd.Categorical.from_codes(patients["gender"], dtype=self.gender_dtype),
+            "comorbidities": pd.Categorical.from_codes(patients["comorbidities"], dtype=self.comorbidity_dtype),
+            "chief_complaint": pd.Categorical.from_codes(patients["chief_complaint"], dtype=self.complaint_dtype),
+            "triage_time": triage_times,
+            "triage_level": patients["triage_level"].astype(np.int8),
+            "wait_minutes": (start - patients["triage_offset"]) / 60.0,
+            "discharge_time": discharge_times,
+            "disposition": pd.Categorical.from_codes(patients["disposition"], dtype=self.disposition_dtype),
+            "primary_staff_id": pd.Categorical.from_codes(staff, dtype=staff_ids),
+            "length_of_stay_hours": (discharge - patients["arrival_offset"]) / 3600.0
+        })
+        if department_dtype is not None:
+            df_patients.insert(1, "department", pd.Categorical.from_codes(patients["department"], dtype=department_dtype))
+        df_patients.attrs[ID_FORMATS] = {"patient_id": PATIENT_ID_FORMAT}
+        
+        yield "patients", df_patients
+        yield "resources", self._generate_resource_usage(patient_ids, start_times, discharge_times, bed,
+                                                         bed_dtype or self.bed_dtype)
+
+    def _arrival_shards(self, num_patients, chunk_size, total_seconds, seed):
+        """
+        Plan consecutive time-slice shards without sorting the whole horizon: the
+        window is cut into equal slices, the number of arrivals per slice is drawn
+        from a multinomial, and each shard later sorts only its own arrivals.
+        """
+        n_slices = max(1, -(-num_patients // chunk_size))
+        edges = np.linspace(0, total_seconds, n_slices + 1).astype(np.int64)
+        counts = stream_rng(seed, ARRIVAL_COUNT_STREAM).multinomial(num_patients, np.diff(edges) / total_seconds)
+        
+        start = 0
+        for index, (low, high, count) in enumerate(zip(edges[:-1], edges[1:], counts)):
+            if count == 0:
+                continue
+            yield {'seed': seed, 'index': index, 'low': int(low), 'high': int(high),
+                   'count': int(count), 'start': start}
+            start += int(count)
+
+    def _map_shards(self, specs):
+        return map(self.generate_shard, specs)
+
+    def generate_shard(self, spec: Dict) -> Dict[str, np.ndarray]:
+        """Sorted arrivals and patient attributes for one time slice."""
+        rng = stream_rng(spec['seed'], PATIENT_STREAM, spec['index'])
+        arrival_offsets = np.sort(rng.integers(spec['low'], spec['high'], size=spec['count']))
+        return self._generate_patients(arrival_offsets, rng, spec['start'])
+
+    def _generate_comorbidities(self, n, rng):
+        """
+        Codes of comorbidity_dtype: 30% "None", otherwise one or two distinct
+        conditions in random order.
+        """
+        n_singles = len(self.comorbidities) - 1
+        n_pairs = len(self.comorbidity_dtype.categories) - 1 - n_singles
+        
+        codes = np.zeros(n, dtype=np.int8)
+        has_any = rng.random(n) >= 0.3
+        two = has_any & (rng.integers(1, 3, size=n) == 2)
+        one = has_any & ~two
+        codes[one] = 1 + rng.integers(0, n_singles, size=int(one.sum()))
+        codes[two] = 1 + n_singles + rng.integers(0, n_pairs, size=int(two.sum()))
+        return codes
+
+    def _assign_triage_levels(self, complaints, rng):
+        """Draw triage levels in bulk, one group of chief complaint codes at a time."""
+        levels = np.empty(len(complaints), dtype=np.int64)
+        chest_pain = complaints == self.complaints.index("Chest Pain")
+        trauma = complaints == self.complaints.index("Severe Trauma")
+        other = ~(chest_pain | trauma)
+        levels[chest_pain] = rng.choice([1, 2], size=int(chest_pain.sum()), p=[0.3, 0.7])
+        levels[trauma] = 1
+        levels[other] = rng.choice([3, 4, 5], size=int(other.sum()), p=[0.4, 0.4, 0.2])
+        return levels
+
+    def _resource_usage_durations(self, triage_levels, rng):
         durations = {
             1: (180, 360),  # 3-6 hours
             2: (120, 240),  # 2-4 hours
@@ -71,84 +401,66 @@ class AgentBasedGenerator:
             4: (60, 120),   # 1-2 hours
             5: (30, 90)     # 0.5-1.5 hours
         }
-        return np.random.randint(*durations[triage_level])
+        minutes = np.empty(len(triage_levels), dtype=np.int64)
+        for level, (low, high) in durations.items():
+            mask = triage_levels == level
+            minutes[mask] = rng.integers(low, high, size=int(mask.sum()))
+        return minutes
 
-    def _generate_patients(self, num_patients, staff_ids):
-        arrival_times = [
-            self._random_timestamp(self.START_DATE, self.END_DATE)
-            for _ in range(num_patients)
-        ]
-        arrival_times.sort()
+    def _generate_patients(self, arrival_offsets, rng, start_index=0):
+        """Column arrays of patient attributes up to triage; treatment timing comes from the simulation."""
+        n = len(arrival_offsets)
+        complaints = rng.integers(0, len(self.complaints), size=n).astype(np.int8)
+        triage_levels = self._assign_triage_levels(complaints, rng)
+        triage_delay = rng.integers(5, 31, size=n)
+        treatment_minutes = self._resource_usage_durations(triage_levels, rng)
+        admitted = (triage_levels <= 2) & (rng.random(n) < 0.1)
+        
+        return {
+            "patient_number": np.arange(start_index + 1, start_index + n + 1),
+            "arrival_offset": arrival_offsets,
+            "age": rng.integers(1, 90, size=n),
+            "gender": rng.choice(len(self.gender_dtype.categories), size=n, p=[0.48, 0.52]).astype(np.int8),
+            "comorbidities": self._generate_comorbidities(n, rng),
+            "chief_complaint": complaints,
+            "triage_offset": arrival_offsets + triage_delay * 60,
+            "triage_level": triage_levels,
+            "disposition": admitted.astype(np.int8),
+            "treatment_minutes": treatment_minutes
+        }
 
-        records = []
-        for i in range(num_patients):
-            patient_id = f"P{i+1:04d}"
-            arrival_time = arrival_times[i]
-            
-            chief_complaint = random.choice(self.complaints)
-            triage_level = self._assign_triage_level(chief_complaint)
-            
-            triage_delay = np.random.randint(5, 31)
-            triage_time = arrival_time + timedelta(minutes=triage_delay)
-            
-            duration = self._resource_usage_duration(triage_level)
-            discharge_time = triage_time + timedelta(minutes=duration)
-            
-            record = {
-                "patient_id": patient_id,
-                "arrival_time": arrival_time,
-                "age": np.random.randint(1, 90),
-                "gender": np.random.choice(["Male", "Female"], p=[0.48, 0.52]),
-                "comorbidities": self._generate_comorbidities(),
-                "chief_complaint": chief_complaint,
-                "triage_time": triage_time,
-                "triage_level": triage_level,
-                "discharge_time": discharge_time,
-                "disposition": "Admitted" if (triage_level <= 2 and random.random() < 0.1) else "Discharged",
-                "primary_staff_id": random.choice(staff_ids),
-                "length_of_stay_hours": (discharge_time - arrival_time).total_seconds() / 3600.0
-            }
-            records.append(record)
-            
-        return pd.DataFrame(records)
-
-    def _generate_staff(self, staff_ids):
-        records = []
-        for s_id in staff_ids:
-            staff_role = random.choice(self.staff_roles)
-            for day in range(self.SIMULATION_DAYS):
-                shift_date = self.START_DATE + timedelta(days=day)
-                
-                # Day shift: 7AM to 7PM
-                shift1_start = shift_date.replace(hour=7, minute=0, second=0)
-                shift1_end = shift_date.replace(hour=19, minute=0, second=0)
-                records.append({
-                    "staff_id": s_id,
-                    "role": staff_role,
-                    "shift_start": shift1_start,
-                    "shift_end": shift1_end
-                })
-                
-                # Night shift: 7PM to 7AM
-                shift2_start = shift_date.replace(hour=19, minute=0, second=0)
-                shift2_end = (shift_date + timedelta(days=1)).replace(hour=7, minute=0, second=0)
-                records.append({
-                    "staff_id": s_id,
-                    "role": staff_role,
-                    "shift_start": shift2_start,
-                    "shift_end": shift2_end
-                })
-                
-        return pd.DataFrame(records)
-
-    def _generate_resource_usage(self, df_patients):
-        records = []
-        for _, patient in df_patients.iterrows():
-            records.append({
-                "patient_id": patient["patient_id"],
-                "resource_id": random.choice(self.bed_ids),
-                "resource_type": "ED Bed",
-                "start_utilization_time": patient["triage_time"],
-                "end_utilization_time": patient["discharge_time"]
-            })
-        return pd.DataFrame(records)
\ No newline at end of file
+    def _generate_staff(self, staff_ids, staff_rotations, n_days, rng):
+        roles = rng.integers(len(self.staff_roles), size=len(staff_ids.categories))
+        return self._staff_shifts(staff_ids, roles, np.asarray(staff_rotations), 0, n_days)
+
+    def _staff_shifts(self, staff_ids, roles, rotations, first_day, n_days):
+        """
+        One row per staff member and day from first_day, staff by staff: day
+        rotation shifts run 7AM to 7PM, night ones 7PM to 7AM the next day.
+        roles are codes of role_dtype, one per staff member.
+        """
+        n_staff = len(staff_ids.categories)
+        staff = np.repeat(np.arange(n_staff), n_days)
+        day = np.tile(np.arange(first_day, first_day + n_days), n_staff)
+        day_shift = rotations[staff] == DAY_ROTATION
+        shift_start = day * 86400 + np.where(day_shift, DAY_SHIFT_START_HOUR, NIGHT_SHIFT_START_HOUR) * 3600
+        shift_end = np.where(day_shift, day * 86400 + NIGHT_SHIFT_START_HOUR * 3600,
+                             (day + 1) * 86400 + DAY_SHIFT_START_HOUR * 3600)
+        return pd.DataFrame({
+            "staff_id": pd.Categorical.from_codes(staff, dtype=staff_ids),
+            "role": pd.Categorical.from_codes(roles[staff], dtype=self.role_dtype),
+            "shift_start": self._to_datetime(shift_start),
+            "shift_end": self._to_datetime(shift_end)
+        })
+
+    def _generate_resource_usage(self, patient_ids, start_times, discharge_times, beds, bed_dtype):
+        df_resources = pd.DataFrame({
+            "patient_id": patient_ids,
+            "resource_id": pd.Categorical.from_codes(beds, dtype=bed_dtype),
+            "resource_type": pd.Categorical.from_codes(np.zeros(len(beds), dtype=np.int8),
+                                                       dtype=self.resource_type_dtype),
+            "start_utilization_time": start_times,
+            "end_utilization_time": discharge_times
+        })
+        df_resources.attrs[ID_FORMATS] = {"patient_id": PATIENT_ID_FORMAT}
+        return df_resources
\ No newline at end of file
@@ -0,0 +1,181 @@
+import heapq
+from collections import deque
+from operator import itemgetter
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Heap event kinds, in the order they are handled when they share a timestamp.
+# Newly triaged patients are handled after both, from a separate sorted list.
+COMPLETE = 0
+SHIFT = 1
+
+DAY_SHIFT_START_HOUR = 7
+NIGHT_SHIFT_START_HOUR = 19
+DAY_ROTATION = 0
+NIGHT_ROTATION = 1
+
+
+class EDSimulation:
+    """
+    Heap-based discrete-event simulation of an emergency department.
+
+    Triaged patients wait in a priority queue (triage level, then triage time)
+    until a bed and an on-shift staff member are both free; each holds them
+    for the patient's treatment duration. Staff belong to a day (07-19) or
+    night (19-07) rotation and only take new patients during their shift,
+    finishing any treatment already in progress.
+
+    Times are integer seconds from midnight of the first simulated day.
+    Patients are fed in arrival-ordered batches; a batch is returned once
+    every patient in it has started treatment, so memory stays bounded by
+    the batch size plus the waiting queue. Events are plain tuples.
+    """
+
+    def __init__(self, n_beds: int, staff_rotations: Sequence[int]):
+        if n_beds < 1:
+            raise ValueError("At least one bed is required")
+        if len(staff_rotations) < 1:
+            raise ValueError("At least one staff member is required")
+
+        self.events = []
+        # One FIFO per priority level: patients join in ready-time order, so each
+        # queue is already sorted by (ready time, patient index)
+        self.waiting = []
+        self.n_waiting = 0
+        self.free_beds = list(range(n_beds))
+        self.staff_rotations = list(staff_rotations)
+        self.free_staff = (deque(), deque())
+        for staff_idx, rotation in enumerate(self.staff_rotations):
+            self.free_staff[rotation].append(staff_idx)
+
+        # Midnight falls inside the night shift
+        self.active_rotation = NIGHT_ROTATION
+        heapq.heappush(self.events, (DAY_SHIFT_START_HOUR * 3600, SHIFT, 0, 0))
+
+        self.now = 0
+        self.pending = deque()
+        self.patients_seen = 0
+        self.ready = []
+        self.ready_pos = 0
+
+    def feed(self, ready_times: np.ndarray, priorities: np.ndarray, durations: np.ndarray,
+             arrival_floor: int, payload=None) -> List[Tuple]:
+        """
+        Add a batch of patients and advance the clock as far as is safe.
+
+        ready_times are when each patient joins the queue, and arrival_floor is
+        a lower bound on the ready time of every patient fed later (the last
+        arrival time of this batch). Returns finished batches, see _completed().
+        """
+        n = len(ready_times)
+        batch = {
+            'payload': payload,
+            'start': [0] * n,
+            'bed': [0] * n,
+            'staff': [0] * n,
+            'remaining': n,
+        }
+        self.pending.append(batch)
+        if n:
+            while len(self.waiting) <= int(priorities.max()):
+                self.waiting.append(deque())
+
+        # Ready events are kept as a time-sorted list rather than in the event
+        # heap: only the few still-unprocessed ones from earlier batches need merging.
+        order = np.argsort(ready_times, kind='stable')
+        base = self.patients_seen
+        new_ready = list(zip(
+            priorities[order].tolist(), ready_times[order].tolist(), (order + base).tolist(),
+            durations[order].tolist(), [batch] * n, order.tolist()
+        ))
+        leftover = self.ready[self.ready_pos:]
+        self.ready = sorted(leftover + new_ready, key=itemgetter(1)) if leftover else new_ready
+        self.ready_pos = 0
+        self.patients_seen += n
+
+        self._run(until=arrival_floor)
+        return self._completed()
+
+    def finish(self) -> List[Tuple]:
+        """Run until every fed patient has started treatment."""
+        self._run(until=None)
+        return self._completed()
+
+    def _run(self, until):
+        events = self.events
+        waiting = self.waiting
+        free_beds = self.free_beds
+        ready = self.ready
+        pos = self.ready_pos
+        n_ready = len(ready)
+        while True:
+            next_ready = ready[pos][1] if pos < n_ready else None
+            if events and (next_ready is None or events[0][0] <= next_ready):
+                time = events[0][0]
+                if until is not None and time >= until:
+                    break
+                if next_ready is None and not self.n_waiting:
+                    break
+                time, kind, a, b = heapq.heappop(events)
+                self.now = time
+                if kind == COMPLETE:
+                    heapq.heappush(free_beds, a)
+                    self.free_staff[self.staff_rotations[b]].append(b)
+                else:
+                    self._change_shift(time)
+            elif next_ready is not None:
+                if until is not None and next_ready >= until:
+                    break
+                self.now = next_ready
+                entry = ready[pos]
+                waiting[entry[0]].append(entry)
+                self.n_waiting += 1
+                pos += 1
+            else:
+                break
+            if free_beds and self.free_staff[self.active_rotation]:
+                self._dispatch()
+        self.ready_pos = pos
+
+    def _change_shift(self, time):
+        if self.active_rotation == NIGHT_ROTATION:
+            self.active_rotation = DAY_ROTATION
+            next_change = time + (NIGHT_SHIFT_START_HOUR - DAY_SHIFT_START_HOUR) * 3600
+        else:
+            self.active_rotation = NIGHT_ROTATION
+            next_change = time + (24 - NIGHT_SHIFT_START_HOUR + DAY_SHIFT_START_HOUR) * 3600
+        heapq.heappush(self.events, (next_change, SHIFT, 0, 0))
+
+    def _dispatch(self):
+        waiting = self.waiting
+        free_beds = self.free_beds
+        free_staff = self.free_staff[self.active_rotation]
+        now = self.now
+        events = self.events
+        while self.n_waiting and free_beds and free_staff:
+            for queue in waiting:
+                if queue:
+                    break
+            _, _, _, duration, batch, local = queue.popleft()
+            self.n_waiting -= 1
+            bed = heapq.heappop(free_beds)
+            staff = free_staff.popleft()
+            batch['start'][local] = now
+            batch['bed'][local] = bed
+            batch['staff'][local] = staff
+            batch['remaining'] -= 1
+            heapq.heappush(events, (now + duration, COMPLETE, bed, staff))
+
+    def _completed(self) -> List[Tuple]:
+        """Pop finished batches in feed order as (payload, start, bed, staff) tuples."""
+        done = []
+        while self.pending and self.pending[0]['remaining'] == 0:
+            batch = self.pending.popleft()
+            done.append((
+                batch['payload'],
+                np.array(batch['start'], dtype=np.int64),
+                np.array(batch['bed'], dtype=np.int64),
+                np.array(batch['staff'], dtype=np.int64)
+            ))
+        return done
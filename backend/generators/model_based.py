@@ -1,18 +1,62 @@
-import torch
+import inspect
+import logging
+import math
+import random
+import sys
+import threading
+import numpy as np
 import pandas as pd
-import pickle
-from typing import Optional, Dict
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+from generators.model_registry import ModelRegistry, default_registry
+from generators.seeding import resolve_seed, stream_rng
+
+logger = logging.getLogger(__name__)
+
+HAZARD_CLASSES = {'hazardous': 1, 'non-hazardous': 0}
+HAZARD_LABELS = {1: 'Hazardous', 0: 'Non-Hazardous'}
+HAZARD_DTYPE = pd.CategoricalDtype(['Non-Hazardous', 'Hazardous'])
+
+# Conditional top-up sampling: largest single model.sample call, headroom
+# added to each oversampled request, the acceptance rate below which a class
+# is treated as unreachable, and the one from which conditional draws are
+# requested without headroom
+MAX_SAMPLE_BATCH = 100_000
+OVERSAMPLE_MARGIN = 1.1
+MIN_ACCEPTANCE = 0.001
+FULL_ACCEPTANCE = 0.999
+
+# Shards seed the process-wide RNGs the model draws from, so threads sampling
+# at the same time (streamed requests) take turns
+_GLOBAL_RNG_LOCK = threading.Lock()
 
 class ModelBasedGenerator:
-    def __init__(self, model_path="C:/Users/HP BITTU/Downloads/ctgan_model.pkl"):
+    def __init__(self, model_name: str = 'ctgan', registry: Optional[ModelRegistry] = None):
+        # The model is loaded from the registry on first use, not here
+        self.model_name = model_name
+        self.registry = registry or default_registry
+        self._model = None
+        self._conditional_support = {}
+
+    @property
+    def model(self):
+        return self._get_model()
+
+    @model.setter
+    def model(self, model):
+        # Pin a specific model object instead of going through the registry
+        self._model = model
+
+    def _get_model(self, name: Optional[str] = None):
+        if self._model is not None and name is None:
+            return self._model
         try:
-            with open(model_path, 'rb') as f:
-                self.model = pickle.load(f)
+            return self.registry.get(name or self.model_name)
         except Exception as e:
-            print(f"Detailed error loading model: {str(e)}")
-            self.model = None
+            logger.error("Detailed error loading model: %s", e)
+            return None
 
-    def generate_data(self, rows: int, params: Optional[Dict] = None) -> pd.DataFrame:
+    def generate_data(self, rows: int, params: Optional[Dict] = None, stats: Optional[Dict] = None) -> pd.DataFrame:
+        """Sample rows in one block; stats, if given, is filled in with its sampling stats."""
         if params is None:
             params = {}
             
@@ -20,22 +64,157 @@ class ModelBasedGenerator:
             rows = int(rows)  # Convert rows to integer
             object_type = params.get('objectType', 'all')
             
-            if self.model is None:
+            model = self._get_model(params.get('model'))
+            if model is None:
                 raise Exception("Model not loaded properly")
                 
             # Generate synthetic samples using CTGAN
-            synthetic_data = self.model.sample(rows)
-            
-            # Filter based on object type if specified
-            if object_type == 'hazardous':
-                synthetic_data = synthetic_data[synthetic_data['Hazardous'] == 1]
-            elif object_type == 'non-hazardous':
-                synthetic_data = synthetic_data[synthetic_data['Hazardous'] == 0]
-            
-            # Convert hazard_status to boolean/string if needed
-            synthetic_data['Hazardous'] = synthetic_data['Hazardous'].map({1: 'Hazardous', 0: 'Non-Hazardous'})
-            
-            return synthetic_data
+            stats = self._init_stats(stats, rows)
+            return self._sample_block(model, rows, object_type, stats)
             
         except Exception as e:
-            raise Exception(f"Error generating data: {e}")
\ No newline at end of file
+            raise Exception(f"Error generating data: {e}")
+
+    def iter_chunks(self, rows: int, params: Optional[Dict] = None, chunk_size: int = 100_000,
+                    map_shards: Optional[Callable[[Iterable[Dict]], Iterable]] = None,
+                    stats: Optional[Dict] = None) -> Iterator[pd.DataFrame]:
+        """
+        Yield exactly rows rows of the requested object type, chunk_size at a time.
+
+        Every chunk is sampled by generate_shard under its own seed, so a seeded
+        request gives the same output however the shards are executed;
+        map_shards (default: map over generate_shard) may run them in other
+        processes. The shards' sampling stats are merged into stats, if given:
+        they belong to the call, as concurrent streams share the generator.
+        """
+        if params is None:
+            params = {}
+
+        try:
+            rows = int(rows)
+            object_type = params.get('objectType', 'all')
+
+            model = self._get_model(params.get('model'))
+            if model is None:
+                raise Exception("Model not loaded properly")
+        except Exception as e:
+            raise Exception(f"Error generating data: {e}")
+
+        stats = self._init_stats(stats, rows)
+        seed = resolve_seed(params)
+        specs = [
+            {'seed': seed, 'index': i, 'rows': min(chunk_size, rows - start),
+             'objectType': object_type, 'model': params.get('model')}
+            for i, start in enumerate(range(0, rows, chunk_size))
+        ]
+        for chunk, shard_stats in (map_shards or self._map_shards)(specs):
+            self._merge_stats(stats, shard_stats)
+            yield chunk
+
+    def _map_shards(self, specs):
+        return map(self.generate_shard, specs)
+
+    def generate_shard(self, spec: Dict) -> Tuple[pd.DataFrame, Dict]:
+        """Sample one chunk with every RNG the model may use seeded from the shard's stream."""
+        model = self._get_model(spec.get('model'))
+        if model is None:
+            raise Exception("Model not loaded properly")
+
+        shard_seed = int(stream_rng(spec['seed'], spec['index']).integers(2 ** 32))
+        stats = self._new_stats(spec['rows'])
+        with _GLOBAL_RNG_LOCK:
+            np.random.seed(shard_seed)
+            random.seed(shard_seed)
+            if 'torch' in sys.modules:
+                sys.modules['torch'].manual_seed(shard_seed)
+            return self._sample_block(model, spec['rows'], spec['objectType'], stats), stats
+
+    @staticmethod
+    def _new_stats(rows: int) -> Dict:
+        return {'requested': rows, 'sampled': 0, 'matched': 0, 'returned': 0, 'sample_calls': 0,
+                'conditional': False, 'efficiency': None}
+
+    def _init_stats(self, stats: Optional[Dict], rows: int) -> Dict:
+        if stats is None:
+            stats = {}
+        stats.clear()
+        stats.update(self._new_stats(rows))
+        return stats
+
+    def _sample_block(self, model, rows: int, object_type: str, stats: Dict) -> pd.DataFrame:
+        if object_type in HAZARD_CLASSES:
+            synthetic_data = self._sample_class(model, rows, HAZARD_CLASSES[object_type], stats)
+        else:
+            synthetic_data = model.sample(rows)
+            self._record(stats, sampled=len(synthetic_data), returned=len(synthetic_data))
+        
+        # Convert hazard_status to boolean/string if needed
+        synthetic_data['Hazardous'] = synthetic_data['Hazardous'].map(HAZARD_LABELS).astype(HAZARD_DTYPE)
+        
+        return synthetic_data
+
+    def _sample_class(self, model, rows: int, target: int, stats: Dict) -> pd.DataFrame:
+        """
+        Return exactly `rows` samples whose Hazardous value is `target`.
+
+        Draws are conditioned on the class through the model's condition
+        vectors where it supports them (CTGAN's condition_column/value), which
+        brings acceptance close to 1. Otherwise, or as a top-up, batches are
+        oversampled by the acceptance rate observed so far until enough rows
+        match; conditional draws that all match are requested exactly.
+        """
+        parts = []
+        collected = 0
+        while collected < rows:
+            remaining = rows - collected
+            acceptance = stats['matched'] / stats['sampled'] if stats['sampled'] else 1.0
+            exact = self._supports_condition(model) and acceptance >= FULL_ACCEPTANCE
+            margin = 1.0 if exact else OVERSAMPLE_MARGIN
+            request = math.ceil(remaining / max(acceptance, MIN_ACCEPTANCE) * margin)
+            request = min(max(request, remaining), MAX_SAMPLE_BATCH)
+
+            batch = self._draw(model, request, target, stats)
+            matched = batch[batch['Hazardous'] == target]
+            taken = matched.iloc[:remaining]
+            parts.append(taken)
+            collected += len(taken)
+            self._record(stats, sampled=len(batch), returned=len(taken), matched=len(matched))
+
+            if stats['matched'] == 0 and stats['sampled'] >= rows / MIN_ACCEPTANCE:
+                raise Exception(f"Model produced no rows with Hazardous={target} in {stats['sampled']} samples")
+
+        return pd.concat(parts, ignore_index=True)
+
+    def _supports_condition(self, model) -> bool:
+        supported = self._conditional_support.get(id(model))
+        if supported is None:
+            supported = 'condition_column' in inspect.signature(model.sample).parameters
+        return supported
+
+    def _draw(self, model, n: int, target: int, stats: Dict) -> pd.DataFrame:
+        if self._supports_condition(model):
+            try:
+                batch = model.sample(n, condition_column='Hazardous', condition_value=target)
+                self._conditional_support[id(model)] = True
+                stats['conditional'] = True
+                return batch
+            except (TypeError, ValueError) as e:
+                # e.g. the condition value is not a category the model was trained on
+                logger.warning("Conditional sampling unavailable, falling back to rejection: %s", e)
+        self._conditional_support[id(model)] = False
+        return model.sample(n)
+
+    @staticmethod
+    def _merge_stats(total: Dict, shard: Dict) -> None:
+        for key in ('sampled', 'matched', 'returned', 'sample_calls'):
+            total[key] += shard[key]
+        total['conditional'] = total['conditional'] or shard['conditional']
+        total['efficiency'] = total['returned'] / total['sampled'] if total['sampled'] else None
+
+    @staticmethod
+    def _record(stats: Dict, sampled: int, returned: int, matched: Optional[int] = None) -> None:
+        stats['sampled'] += sampled
+        stats['matched'] += returned if matched is None else matched
+        stats['returned'] += returned
+        stats['sample_calls'] += 1
+        stats['efficiency'] = stats['returned'] / stats['sampled'] if stats['sampled'] else None
@@ -0,0 +1,103 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+
+def load_model(path: str):
+    """
+    Load a model file. Torch checkpoints (.pt/.pth) are memory-mapped, so the
+    weights live in the page cache and are shared by every process that maps
+    the same file; anything else is unpickled. torch is only imported here.
+    """
+    if path.endswith(('.pt', '.pth')):
+        import torch
+        return torch.load(path, map_location='cpu', mmap=True, weights_only=False)
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+class ModelRegistry:
+    """
+    Named models loaded lazily on first use and kept in an LRU cache.
+
+    Loading is thread-safe and happens at most once per model even under
+    concurrent requests; different models can load in parallel. The cache
+    holds at most max_models models and evicts the least recently used ones
+    when their estimated size (the model file size) exceeds memory_budget.
+    Call preload() before forking workers so they share the loaded pages
+    copy-on-write instead of each loading its own copy.
+    """
+
+    def __init__(self, paths: Optional[Dict[str, str]] = None, memory_budget: int = 2 * 1024 ** 3,
+                 max_models: int = 4, loader=load_model):
+        self.paths = dict(paths or {})
+        self.memory_budget = memory_budget
+        self.max_models = max_models
+        self.loader = loader
+        self._models = OrderedDict()  # name -> (model, size)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def register(self, name: str, path: str) -> None:
+        with self._lock:
+            self.paths[name] = path
+            self._models.pop(name, None)
+
+    def get(self, name: str):
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name][0]
+            if name not in self.paths:
+                raise KeyError(f"Unknown model: {name}")
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            # Another thread may have finished loading while we waited
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    return self._models[name][0]
+                path = self.paths[name]
+
+            model = self.loader(path)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+
+            with self._lock:
+                self._models[name] = (model, size)
+                self.loads += 1
+                self._evict(keep=name)
+            return model
+
+    def preload(self, names: Iterable[str]) -> None:
+        for name in names:
+            self.get(name)
+
+    def loaded(self) -> Dict[str, int]:
+        with self._lock:
+            return {name: size for name, (_, size) in self._models.items()}
+
+    def _evict(self, keep: str) -> None:
+        def over_budget():
+            total = sum(size for _, size in self._models.values())
+            return len(self._models) > self.max_models or total > self.memory_budget
+
+        while over_budget() and len(self._models) > 1:
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            del self._models[oldest]
+            self.evictions += 1
+
+
+def _default_registry():
+    from config import MODEL_PATHS, MODEL_CACHE_BYTES, MODEL_CACHE_SIZE
+    return ModelRegistry(MODEL_PATHS, memory_budget=MODEL_CACHE_BYTES, max_models=MODEL_CACHE_SIZE)
+
+
+# Shared by every ModelBasedGenerator in the process
+default_registry = _default_registry()
@@ -0,0 +1,179 @@
+import importlib
+import threading
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_LOCALE = 'en_US'
+SEX_ATTRIBUTES = {'M': 'male', 'F': 'female'}
+# Codes in one pin code range; offsets within a range are drawn from a float
+MAX_PIN_RANGE = 10 ** 9
+
+
+def _weighted(names) -> Tuple[np.ndarray, np.ndarray]:
+    """(names, cumulative weights) from a Faker name list: a weighted dict or a plain tuple."""
+    if hasattr(names, 'values'):
+        values = np.array(list(names.keys()), dtype=object)
+        weights = np.array(list(names.values()), dtype=float)
+    else:
+        values = np.array(list(names), dtype=object)
+        weights = np.ones(len(values))
+    cdf = np.cumsum(weights)
+    return values, cdf / cdf[-1]
+
+
+def _draw(table: Tuple[np.ndarray, np.ndarray], n: int, rng: np.random.Generator) -> np.ndarray:
+    values, cdf = table
+    index = np.searchsorted(cdf, rng.random(n), side='right')
+    return values[np.minimum(index, len(values) - 1)]
+
+
+def _own_names(provider, base, *attributes):
+    """The first of a locale's name lists that it defines itself, not inherited from Faker's placeholders."""
+    for attribute in attributes:
+        names = getattr(provider, attribute, None)
+        if names and names is not getattr(base, attribute, None):
+            return names
+    return None
+
+
+def _surnames(provider, base, attribute):
+    """A locale's surnames for one sex, however the locale names its lists."""
+    names = _own_names(provider, base, f'last_names_{attribute}')
+    if names:
+        return names
+    # e.g. pl_PL: male-only surname forms, plus surnames of either sex
+    unisex = _own_names(provider, base, 'unisex_last_names', 'last_names_unisex')
+    names = _own_names(provider, base, f'{attribute}_last_names')
+    if names and unisex and not hasattr(names, 'values') and not hasattr(unisex, 'values'):
+        return tuple(names) + tuple(unisex)
+    return names or _own_names(provider, base, 'last_names') or unisex
+
+
+class NamePool:
+    """
+    First names per sex and last names of one Faker locale, with Faker's
+    frequency weights where the locale has them (uniform otherwise).
+
+    Only the distinct names are stored; sample() draws whole batches by
+    binary search over the cumulative weights. Names are "first last";
+    Faker's occasional prefixes and suffixes are left out. Locales without
+    name lists of their own (Faker's "John Doe" placeholders) are rejected.
+    """
+
+    def __init__(self, locale: str):
+        try:
+            provider = importlib.import_module(f'faker.providers.person.{locale}').Provider
+            base = importlib.import_module('faker.providers.person').Provider
+        except ImportError:
+            raise ValueError(f"Unknown locale: {locale}")
+        self.locale = locale
+        self.first = {}
+        self.last = {}
+        for sex, attribute in SEX_ATTRIBUTES.items():
+            first = _own_names(provider, base, f'first_names_{attribute}', 'first_names')
+            # Some locales inflect surnames by sex
+            last = _surnames(provider, base, attribute)
+            if not first or not last:
+                kind = 'first names' if not first else 'surnames'
+                raise ValueError(f"Locale {locale} has no {attribute} {kind} of its own")
+            self.first[sex] = _weighted(first)
+            self.last[sex] = _weighted(last)
+
+    def sample(self, sex: str, n: int, rng: np.random.Generator) -> np.ndarray:
+        names = _draw(self.first[sex], n, rng) + ' '
+        names += _draw(self.last[sex], n, rng)
+        return names
+
+
+_name_pools = {}
+_name_pools_lock = threading.Lock()
+
+
+def get_name_pool(locale: str = DEFAULT_LOCALE) -> NamePool:
+    """The NamePool for a locale, built on first use and shared within the process."""
+    with _name_pools_lock:
+        if locale not in _name_pools:
+            _name_pools[locale] = NamePool(locale)
+        return _name_pools[locale]
+
+
+def parse_locales(value) -> Dict[str, float]:
+    """
+    Locale mix of a request: one locale, a list (equal shares) or a
+    {locale: weight} dict. Returns normalised weights; unknown locales raise.
+    """
+    if value is None:
+        value = DEFAULT_LOCALE
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, dict):
+        value = {locale: 1.0 for locale in value}
+    if not value:
+        raise ValueError("At least one locale is required")
+    weights = {str(locale): float(weight) for locale, weight in value.items()}
+    if any(weight < 0 for weight in weights.values()) or sum(weights.values()) <= 0:
+        raise ValueError("Locale weights must be non-negative and not all zero")
+    for locale in weights:
+        get_name_pool(locale)
+    total = sum(weights.values())
+    return {locale: weight / total for locale, weight in weights.items()}
+
+
+class PhonePool:
+    """
+    US-style phone numbers "(area)-exchange-line" per state. Every
+    "(area)-exchange-" prefix is formatted once, so a batch costs two table
+    lookups and one string concatenation per row.
+    """
+
+    EXCHANGES = range(100, 1000)
+    LINES = range(1000, 10000)
+
+    def __init__(self, area_codes: Sequence[Sequence[str]]):
+        self.max_codes = max(len(codes) for codes in area_codes)
+        self.code_counts = np.array([len(codes) for codes in area_codes])
+        prefixes = np.empty((len(area_codes), self.max_codes, len(self.EXCHANGES)), dtype=object)
+        for state, codes in enumerate(area_codes):
+            for i, code in enumerate(codes):
+                prefixes[state, i] = [f"({code})-{exchange}-" for exchange in self.EXCHANGES]
+        self.prefixes = prefixes.ravel()
+        self.lines = np.array([str(line) for line in self.LINES], dtype=object)
+
+    def sample(self, state_idx: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        n = len(state_idx)
+        code_idx = (rng.random(n) * self.code_counts[state_idx]).astype(np.int64)
+        exchange_idx = rng.integers(0, len(self.EXCHANGES), size=n)
+        prefix_idx = (state_idx * self.max_codes + code_idx) * len(self.EXCHANGES) + exchange_idx
+        return self.prefixes[prefix_idx] + self.lines[rng.integers(0, len(self.LINES), size=n)]
+
+
+class PinPool:
+    """
+    Pin codes (int64) drawn uniformly from one of a state's inclusive ranges,
+    as the range's low end plus an offset, so no range is ever enumerated.
+    """
+
+    def __init__(self, pin_ranges: Sequence[Sequence[Tuple[int, int]]]):
+        max_ranges = max(len(ranges) for ranges in pin_ranges)
+        if max_ranges == 0:
+            raise ValueError("Pin codes need at least one range")
+        self.range_counts = np.array([len(ranges) for ranges in pin_ranges])
+        self.lows = np.zeros((len(pin_ranges), max_ranges), dtype=np.int64)
+        self.sizes = np.zeros((len(pin_ranges), max_ranges), dtype=np.int64)
+        for state, ranges in enumerate(pin_ranges):
+            for i, pin_range in enumerate(ranges):
+                low, high = pin_range
+                if not isinstance(low, int) or not isinstance(high, int) or not 0 <= low <= high:
+                    raise ValueError(f"Invalid pin code range: {pin_range}")
+                if high - low + 1 > MAX_PIN_RANGE:
+                    raise ValueError(f"Pin code range {pin_range} has more than {MAX_PIN_RANGE} codes")
+                self.lows[state, i] = low
+                self.sizes[state, i] = high - low + 1
+
+    def sample(self, state_idx: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        n = len(state_idx)
+        range_idx = (rng.random(n) * self.range_counts[state_idx]).astype(np.int64)
+        sizes = self.sizes[state_idx, range_idx]
+        within = (rng.random(n) * sizes).astype(np.int64)
+        return self.lows[state_idx, range_idx] + within
@@ -0,0 +1,609 @@
+import hashlib
+import json
+import math
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from generators.pii import SEX_ATTRIBUTES, PhonePool, PinPool, get_name_pool, parse_locales
+from generators.seeding import stream_rng
+from writers import ID_FORMATS
+
+# Largest alias table of a conditional choice: parent value combinations
+# times values (16 bytes each), which also bounds the time to compile it
+MAX_CONDITION_CELLS = 4_000_000
+
+
+def load_schema(source, schema_dir: str) -> Dict:
+    """
+    A schema as a dict: `source` is either the schema itself or the name of a
+    .json, .yaml or .yml file in schema_dir (YAML needs the 'pyyaml' package).
+    """
+    if isinstance(source, dict):
+        return source
+    if not isinstance(source, str) or not source.replace('_', '').replace('-', '').isalnum():
+        raise ValueError(f"Invalid schema name: {source}")
+    for ext in ('.json', '.yaml', '.yml'):
+        path = os.path.join(schema_dir, source + ext)
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            if ext == '.json':
+                return json.load(f)
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("YAML schemas require the 'pyyaml' package")
+            return yaml.safe_load(f)
+    raise ValueError(f"Unknown schema: {source}")
+
+
+def fingerprint(spec: Dict) -> str:
+    encoded = json.dumps(spec, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _resolve(value, params: Dict):
+    """A literal, or {"param": name, "default": ...} read from the request params."""
+    if isinstance(value, dict) and 'param' in value:
+        return params.get(value['param'], value.get('default'))
+    return value
+
+
+def _alias_tables(weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Walker/Vose alias tables, one per row of weights (rows with positive
+    sums): (acceptance probability, alias) per outcome.
+
+    Every row runs Vose's algorithm with its own small and large stacks, in
+    lockstep: each step pairs the top of both stacks in all rows still
+    pairing, so the cost is linear in the table size.
+    """
+    n, k = weights.shape
+    scaled = weights * (k / weights.sum(axis=1, keepdims=True))
+    prob = np.ones((n, k))
+    alias = np.tile(np.arange(k), (n, 1))
+    is_small = scaled < 1
+    # Stacks hold indices in ascending order, so the top is the highest
+    small = np.argsort(~is_small, axis=1, kind='stable')
+    large = np.argsort(is_small, axis=1, kind='stable')
+    small_top = is_small.sum(axis=1)
+    large_top = k - small_top
+
+    rows = np.flatnonzero((small_top > 0) & (large_top > 0))
+    while len(rows):
+        s = small[rows, small_top[rows] - 1]
+        l = large[rows, large_top[rows] - 1]
+        prob[rows, s] = scaled[rows, s]
+        alias[rows, s] = l
+        scaled[rows, l] -= 1 - scaled[rows, s]
+        # l moves to the small stack, in the slot s was popped from, or stays on the large one
+        to_small = scaled[rows, l] < 1
+        small[rows[to_small], small_top[rows[to_small]] - 1] = l[to_small]
+        small_top[rows[~to_small]] -= 1
+        large_top[rows[to_small]] -= 1
+        rows = rows[(small_top[rows] > 0) & (large_top[rows] > 0)]
+    return prob, alias
+
+
+class Batch:
+    """Columns drawn so far for one shard: rows start to start + n."""
+
+    def __init__(self, n: int, start: int):
+        self.n = n
+        self.start = start
+        self.values = {}
+
+
+class Column:
+    """
+    One compiled column of a schema.
+
+    sample() returns the column's raw values: category codes for categorical
+    columns, plain numbers otherwise, which is what dependent columns see.
+    finish() turns them into the DataFrame column. bind() validates a
+    request's params once, returning plain (picklable) options for sample().
+    """
+
+    categorical = False
+    # (prefix, width) of an integer column written as ID strings (see writers.ID_FORMATS)
+    id_format = None
+    # Columns usable as conditions have a finite domain of keys 0..domain-1
+    domain = None
+
+    def __init__(self, name: str, spec: Dict, schema: 'Schema'):
+        self.name = name
+        self.spec = spec
+        self.schema = schema
+        self.output = spec.get('output', True)
+
+    @property
+    def depends(self) -> Tuple[str, ...]:
+        return ()
+
+    def bind(self, params: Dict):
+        return None
+
+    def sample(self, batch: Batch, rng: np.random.Generator, options) -> np.ndarray:
+        raise NotImplementedError
+
+    def finish(self, values: np.ndarray):
+        return values
+
+    def keys(self, values: np.ndarray) -> np.ndarray:
+        raise ValueError(f"Column {self.name} cannot be used as a condition")
+
+    def label(self, key: int):
+        raise ValueError(f"Column {self.name} cannot be used as a condition")
+
+    def labels(self) -> np.ndarray:
+        """label() of every key, in key order."""
+        raise ValueError(f"Column {self.name} cannot be used as a condition")
+
+    def key_of(self, text: str) -> Optional[int]:
+        """The key whose label is written `text` in a table, or None."""
+        raise ValueError(f"Column {self.name} cannot be used as a condition")
+
+
+class SequenceColumn(Column):
+    """Row numbers from `start` (default 1)."""
+
+    def sample(self, batch, rng, options):
+        start = int(self.spec.get('start', 1))
+        return np.arange(start + batch.start, start + batch.start + batch.n)
+
+
+class IntegerColumn(Column):
+    """
+    Uniform integers in [min, max], both inclusive. `bounds` limits what the
+    params may ask for and is the column's domain as a condition.
+    """
+
+    def __init__(self, name, spec, schema):
+        super().__init__(name, spec, schema)
+        low, high = spec.get('bounds', (spec.get('min'), spec.get('max')))
+        if not all(isinstance(v, int) for v in (low, high)) or low > high:
+            raise ValueError(f"Column {name} needs integer bounds (or literal min and max)")
+        self.bounds = (low, high)
+        self.domain = high - low + 1
+        self.dtype = np.dtype(spec.get('dtype', 'int64'))
+
+    def bind(self, params):
+        try:
+            low = int(_resolve(self.spec['min'], params))
+            high = int(_resolve(self.spec['max'], params))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{self.name}: min and max must be integers")
+        if not self.bounds[0] <= low <= high <= self.bounds[1]:
+            raise ValueError(f"{self.name} must be within {self.bounds[0]}-{self.bounds[1]}, min <= max")
+        return low, high
+
+    def sample(self, batch, rng, options):
+        low, high = options
+        return rng.integers(low, high + 1, size=batch.n)
+
+    def finish(self, values):
+        return values.astype(self.dtype)
+
+    def keys(self, values):
+        return values - self.bounds[0]
+
+    def label(self, key):
+        return self.bounds[0] + key
+
+    def labels(self):
+        return np.arange(self.bounds[0], self.bounds[1] + 1)
+
+    def key_of(self, text):
+        try:
+            value = int(text)
+        except ValueError:
+            return None
+        if str(value) != text or not self.bounds[0] <= value <= self.bounds[1]:
+            return None
+        return value - self.bounds[0]
+
+
+class ChoiceColumn(Column):
+    """
+    Categorical column: one of `values`, or one of the keys of `table`.
+
+    Weights are `weights` (a list or {value: weight}), times, for each entry
+    of `conditions`, either a table field keyed by another column's value
+    ({"field": ..., "by": column}) or an indicator that another column's
+    value lies in a table field's [low, high] range ({"range": ..., "by": column}).
+    Every combination of the conditions' values gets its own alias table.
+    `fixed` ({"param": ...}) pins every row to one value when the param is set.
+    """
+
+    categorical = True
+
+    def __init__(self, name, spec, schema):
+        super().__init__(name, spec, schema)
+        if 'table' in spec:
+            self.table = schema.table(spec['table'])
+            self.values = list(self.table)
+        elif 'values' in spec:
+            self.table = None
+            self.values = list(spec['values'])
+        else:
+            raise ValueError(f"Column {name} needs values or a table")
+        if not self.values:
+            raise ValueError(f"Column {name} has no values")
+        self.dtype = pd.CategoricalDtype(self.values)
+        self.domain = len(self.values)
+        self.conditions = spec.get('conditions', [])
+        for condition in self.conditions:
+            if 'by' not in condition or ('field' in condition) == ('range' in condition):
+                raise ValueError(f"Column {name}: each condition needs 'by' and one of 'field' or 'range'")
+            if self.table is None:
+                raise ValueError(f"Column {name}: conditions need a table")
+        self.prob = None
+        self.alias = None
+        self.valid = None
+        self._keys = None
+
+    @property
+    def depends(self):
+        return tuple(dict.fromkeys(condition['by'] for condition in self.conditions))
+
+    def _base_weights(self):
+        weights = self.spec.get('weights')
+        if weights is None:
+            return np.ones(len(self.values))
+        if isinstance(weights, dict):
+            weights = [weights.get(value, 0) for value in self.values]
+        weights = np.asarray(weights, dtype=float)
+        if weights.shape != (len(self.values),) or np.any(weights < 0):
+            raise ValueError(f"Column {self.name}: weights must be one non-negative number per value")
+        return weights
+
+    def _factors(self, condition, parent):
+        """The condition's weight factor per key of parent (rows) and value (columns)."""
+        factors = np.zeros((parent.domain, len(self.values)))
+        if 'field' in condition:
+            # Only the keys listed in the table are visited
+            for i, value in enumerate(self.values):
+                for text, factor in self.table[value][condition['field']].items():
+                    key = parent.key_of(text)
+                    if key is not None:
+                        factors[key, i] = float(factor)
+        else:
+            labels = parent.labels()
+            for i, value in enumerate(self.values):
+                low, high = self.table[value][condition['range']]
+                factors[:, i] = (labels >= low) & (labels <= high)
+        return factors
+
+    def compile(self):
+        """Build the alias tables; parents must be compiled first (the schema's order guarantees it)."""
+        base = self._base_weights()
+        parents = [self.schema.columns[name] for name in self.depends]
+        for parent in parents:
+            if parent.domain is None:
+                raise ValueError(f"Column {self.name} cannot depend on {parent.name}, which has no finite domain")
+        domains = [parent.domain for parent in parents]
+        n_keys = math.prod(domains)
+        k = len(self.values)
+        if n_keys * k > MAX_CONDITION_CELLS:
+            raise ValueError(f"Column {self.name} has too many condition combinations times values "
+                             f"({n_keys} x {k}, limit {MAX_CONDITION_CELLS})")
+
+        # Row-major over the parents, matching the key computed in sample()
+        parent_keys = dict(zip(self.depends, np.unravel_index(np.arange(n_keys), domains) if domains else ()))
+        weights = np.tile(base, (n_keys, 1))
+        for condition in self.conditions:
+            parent = self.schema.columns[condition['by']]
+            weights *= self._factors(condition, parent)[parent_keys[parent.name]]
+        self.valid = weights.sum(axis=1) > 0
+        weights[~self.valid] = 1
+        prob, alias = _alias_tables(weights)
+        self.prob = prob.ravel()
+        self.alias = alias.ravel()
+
+    def bind(self, params):
+        fixed = _resolve(self.spec.get('fixed'), params)
+        if fixed is None:
+            return None
+        if fixed not in self.values:
+            raise ValueError(f"Unknown {self.name}: {fixed}")
+        return self.values.index(fixed)
+
+    def sample(self, batch, rng, options):
+        n = batch.n
+        if options is not None:
+            return np.full(n, options, dtype=np.intp)
+
+        key = np.zeros(n, dtype=np.intp)
+        for parent in (self.schema.columns[name] for name in self.depends):
+            key *= parent.domain
+            key += parent.keys(batch.values[parent.name])
+        invalid = ~self.valid[key]
+        if invalid.any():
+            row = np.flatnonzero(invalid)[0]
+            context = []
+            for name in self.depends:
+                parent = self.schema.columns[name]
+                context.append(f"{name}={parent.label(int(parent.keys(batch.values[name][row])))}")
+            raise ValueError(f"No suitable {self.name} for {', '.join(context)}")
+
+        # One uniform per row: its integer part picks a slot, its fraction accepts or takes the alias
+        k = len(self.values)
+        u = rng.random(n) * k
+        slot = u.astype(np.intp)
+        np.minimum(slot, k - 1, out=slot)
+        u -= slot
+        index = key * k + slot
+        return np.where(u < self.prob[index], slot, self.alias[index])
+
+    def finish(self, values):
+        return pd.Categorical.from_codes(values, dtype=self.dtype)
+
+    def keys(self, values):
+        return values
+
+    def label(self, key):
+        return self.values[key]
+
+    def labels(self):
+        return np.array(self.values, dtype=object)
+
+    def key_of(self, text):
+        if self._keys is None:
+            self._keys = {str(value): i for i, value in enumerate(self.values)}
+        return self._keys.get(text)
+
+
+def _lookup(schema: 'Schema', column: str, spec) -> Tuple[Optional[str], np.ndarray]:
+    """
+    A number, or a table field looked up by a table choice column
+    ({"by": column, "field": ...}): (parent name or None, values per parent code).
+    """
+    if not isinstance(spec, dict):
+        return None, np.asarray(spec, dtype=float)
+    parent = schema.columns.get(spec.get('by'))
+    if not isinstance(parent, ChoiceColumn) or parent.table is None:
+        raise ValueError(f"Column {column}: lookups need 'by' naming a table choice column")
+    try:
+        values = [parent.table[value][spec['field']] for value in parent.values]
+    except KeyError as e:
+        raise ValueError(f"Column {column}: no field {e} in table of {parent.name}")
+    return parent.name, np.asarray(values, dtype=float)
+
+
+class UniformColumn(Column):
+    """
+    Uniform floats in `range` ([low, high] or a lookup of [low, high] pairs),
+    times an optional `scale` (number or lookup), rounded to `round` places.
+    """
+
+    def __init__(self, name, spec, schema):
+        super().__init__(name, spec, schema)
+        if 'range' not in spec:
+            raise ValueError(f"Column {name} needs a range")
+
+    @property
+    def depends(self):
+        return tuple(spec['by'] for spec in (self.spec['range'], self.spec.get('scale'))
+                     if isinstance(spec, dict) and 'by' in spec)
+
+    def compile(self):
+        self.range_by, ranges = _lookup(self.schema, self.name, self.spec['range'])
+        ranges = ranges.reshape(-1, 2)
+        self.low, self.width = ranges[:, 0], ranges[:, 1] - ranges[:, 0]
+        self.scale_by, self.scale = _lookup(self.schema, self.name, self.spec.get('scale', 1.0))
+
+    def sample(self, batch, rng, options):
+        u = rng.random(batch.n)
+        if self.range_by is None:
+            values = self.low[0] + u * self.width[0]
+        else:
+            codes = batch.values[self.range_by]
+            values = self.low[codes] + u * self.width[codes]
+        values *= self.scale if self.scale_by is None else self.scale[batch.values[self.scale_by]]
+        if 'round' in self.spec:
+            np.round(values, int(self.spec['round']), out=values)
+        return values
+
+
+class LookupColumn(Column):
+    """A numeric table field of a table choice column's value: {"by": column, "field": ...}."""
+
+    @property
+    def depends(self):
+        return (self.spec.get('by'),)
+
+    def compile(self):
+        _, self.table_values = _lookup(self.schema, self.name, self.spec)
+
+    def sample(self, batch, rng, options):
+        return self.table_values[batch.values[self.spec['by']]]
+
+
+class NameColumn(Column):
+    """
+    "first last" names from the weighted Faker pools of a locale mix
+    (`locale`: one locale, a list or {locale: weight}), by the `sex` column (M/F).
+    """
+
+    @property
+    def depends(self):
+        return (self.spec['sex'],) if 'sex' in self.spec else ()
+
+    def compile(self):
+        if 'sex' in self.spec:
+            sex = self.schema.columns[self.spec['sex']]
+            if not sex.categorical or not set(sex.values) <= set(SEX_ATTRIBUTES):
+                raise ValueError(f"Column {self.name}: sex must be a choice of {', '.join(SEX_ATTRIBUTES)}")
+
+    def bind(self, params):
+        try:
+            return parse_locales(_resolve(self.spec.get('locale'), params))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid locale: {e}")
+
+    def sample(self, batch, rng, options):
+        n = batch.n
+        locale_names = list(options)
+        if len(locale_names) > 1:
+            locale_idx = np.searchsorted(np.cumsum(list(options.values())), rng.random(n), side='right')
+            np.minimum(locale_idx, len(locale_names) - 1, out=locale_idx)
+        else:
+            locale_idx = np.zeros(n, dtype=np.int64)
+
+        if 'sex' in self.spec:
+            sex = self.schema.columns[self.spec['sex']]
+            sex_codes, sexes = batch.values[sex.name], sex.values
+        else:
+            sex_codes = rng.integers(0, len(SEX_ATTRIBUTES), size=n)
+            sexes = list(SEX_ATTRIBUTES)
+
+        names = np.empty(n, dtype=object)
+        for j, locale in enumerate(locale_names):
+            pool = get_name_pool(locale)
+            for i, sex_label in enumerate(sexes):
+                mask = (sex_codes == i) & (locale_idx == j)
+                names[mask] = pool.sample(sex_label, int(mask.sum()), rng)
+        return names
+
+
+class _PoolColumn(Column):
+    """Values drawn from a pii pool built from a table field, by a table choice column."""
+
+    pool_class = None
+
+    @property
+    def depends(self):
+        return (self.spec.get('by'),)
+
+    def compile(self):
+        parent = self.schema.columns.get(self.spec.get('by'))
+        if not isinstance(parent, ChoiceColumn) or parent.table is None:
+            raise ValueError(f"Column {self.name} needs 'by' naming a table choice column")
+        try:
+            self.entries = [parent.table[value][self.spec['field']] for value in parent.values]
+        except KeyError as e:
+            raise ValueError(f"Column {self.name}: no field {e} in table of {parent.name}")
+        self._pool = None
+
+    @property
+    def pool(self):
+        # Formatted tables are built on first use
+        if self._pool is None:
+            self._pool = self.pool_class(self.entries)
+        return self._pool
+
+    def sample(self, batch, rng, options):
+        return self.pool.sample(batch.values[self.spec['by']], rng)
+
+
+class PhoneColumn(_PoolColumn):
+    """US-style "(area)-exchange-line" numbers from a table field of area codes."""
+
+    pool_class = PhonePool
+
+
+class PinColumn(_PoolColumn):
+    """Pin codes from a table field of inclusive [low, high] ranges, written as plain digits."""
+
+    pool_class = PinPool
+    id_format = ("", 0)
+
+    def compile(self):
+        super().compile()
+        # Cheap to build, and validates the ranges up front
+        self.pool
+
+
+# Column "type" -> implementation; new kinds of column are registered here
+COLUMN_TYPES = {
+    'sequence': SequenceColumn,
+    'integer': IntegerColumn,
+    'choice': ChoiceColumn,
+    'uniform': UniformColumn,
+    'lookup': LookupColumn,
+    'name': NameColumn,
+    'phone': PhoneColumn,
+    'pin': PinColumn,
+}
+
+
+class Schema:
+    """
+    A declarative dataset definition compiled into vectorised column samplers.
+
+    The spec has `tables` ({name: {key: {field: value}}}) and `columns`
+    ({name: {"type": ..., ...}}, see COLUMN_TYPES), in output order. Columns
+    are sampled in dependency order, each batch-wise from its own random
+    stream, so adding a column does not change the others' values.
+    """
+
+    def __init__(self, spec: Dict):
+        if not isinstance(spec, dict) or not isinstance(spec.get('columns'), dict) or not spec['columns']:
+            raise ValueError("A schema needs a non-empty 'columns' object")
+        self.spec = spec
+        self.name = spec.get('name', 'schema')
+        self.fingerprint = fingerprint(spec)
+        self.tables = spec.get('tables', {})
+
+        self.columns = {}
+        for name, column_spec in spec['columns'].items():
+            kind = column_spec.get('type') if isinstance(column_spec, dict) else None
+            if kind not in COLUMN_TYPES:
+                raise ValueError(f"Column {name}: unknown type {kind} (expected one of {', '.join(COLUMN_TYPES)})")
+            self.columns[name] = COLUMN_TYPES[kind](name, column_spec, self)
+
+        self.order = self._dependency_order()
+        for name in self.order:
+            column = self.columns[name]
+            if hasattr(column, 'compile'):
+                column.compile()
+        # Random stream of each column within a shard, keyed by its name
+        self.stream_keys = {name: zlib.crc32(name.encode('utf-8')) for name in self.columns}
+
+    def table(self, name: str) -> Dict:
+        if name not in self.tables:
+            raise ValueError(f"Unknown table: {name}")
+        return self.tables[name]
+
+    def _dependency_order(self) -> List[str]:
+        """Columns in topological order, ties kept in declaration order."""
+        for column in self.columns.values():
+            for parent in column.depends:
+                if parent not in self.columns:
+                    raise ValueError(f"Column {column.name} depends on unknown column {parent}")
+        order, done = [], set()
+        pending = list(self.columns)
+        while pending:
+            ready = [name for name in pending if set(self.columns[name].depends) <= done]
+            if not ready:
+                raise ValueError(f"Schema has a dependency cycle among: {', '.join(pending)}")
+            for name in ready:
+                order.append(name)
+                done.add(name)
+            pending = [name for name in pending if name not in done]
+        return order
+
+    def bind(self, params: Optional[Dict]) -> Dict:
+        """Validate a request's params: per-column options for sample()."""
+        params = params or {}
+        return {name: self.columns[name].bind(params) for name in self.order}
+
+    def sample(self, n: int, start: int, seed: int, index: int, options: Dict) -> pd.DataFrame:
+        """Rows start to start + n, the shard `index` of a run with `seed`."""
+        batch = Batch(n, start)
+        for name in self.order:
+            rng = stream_rng(seed, index, self.stream_keys[name])
+            batch.values[name] = self.columns[name].sample(batch, rng, options.get(name))
+        df = pd.DataFrame({
+            name: column.finish(batch.values[name])
+            for name, column in self.columns.items() if column.output
+        })
+        id_formats = {name: column.id_format for name, column in self.columns.items()
+                      if column.output and column.id_format is not None}
+        if id_formats:
+            df.attrs[ID_FORMATS] = id_formats
+        return df
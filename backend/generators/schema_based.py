@@ -0,0 +1,91 @@
+import threading
+import pandas as pd
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, Optional
+from generators.schema import Schema, fingerprint, load_schema
+from generators.seeding import resolve_seed
+
+# Compiled schemas kept per process, by content
+MAX_CACHED_SCHEMAS = 16
+
+
+class SchemaBasedGenerator:
+    """
+    Generates any dataset described by a declarative schema (see
+    generators.schema.Schema), named by the `schema` param: a file in
+    SCHEMA_DIR, or the schema itself. The schema's own params ({"param": ...}
+    references) are read from the same request.
+    """
+
+    def __init__(self, schema=None):
+        # A fixed schema (name or spec); the `schema` param is then ignored.
+        # It is loaded once, unlike named schemas, which are re-read per request.
+        self.default_schema = schema
+        self._default = None
+        self._schemas = OrderedDict()
+        self._schemas_lock = threading.Lock()
+
+    def get_schema(self, params: Optional[Dict] = None) -> Schema:
+        """The compiled schema of a request, compiled once per distinct schema."""
+        from config import SCHEMA_DIR
+
+        if self.default_schema is not None:
+            if self._default is None:
+                self._default = Schema(load_schema(self.default_schema, SCHEMA_DIR))
+            return self._default
+
+        source = (params or {}).get('schema')
+        if source is None:
+            raise ValueError("The schema param is required")
+        spec = load_schema(source, SCHEMA_DIR)
+        key = fingerprint(spec)
+        with self._schemas_lock:
+            schema = self._schemas.get(key)
+            if schema is not None:
+                self._schemas.move_to_end(key)
+                return schema
+
+        try:
+            schema = Schema(spec)
+        except (AttributeError, KeyError, TypeError) as e:
+            raise ValueError(f"Invalid schema: {e!r}")
+        with self._schemas_lock:
+            self._schemas[key] = schema
+            if len(self._schemas) > MAX_CACHED_SCHEMAS:
+                self._schemas.popitem(last=False)
+        return schema
+
+    def _parse_params(self, rows, params):
+        schema = self.get_schema(params)
+        return int(rows), schema, schema.bind(params)
+
+    def generate_data(self, rows: int, params: Optional[Dict] = None) -> pd.DataFrame:
+        rows, schema, options = self._parse_params(rows, params)
+        return schema.sample(rows, 0, resolve_seed(params), 0, options)
+
+    def iter_chunks(self, rows: int, params: Optional[Dict] = None, chunk_size: int = 100_000,
+                    map_shards: Optional[Callable[[Iterable[Dict]], Iterable]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Yield the dataset as consecutive DataFrames of at most chunk_size rows.
+
+        Each chunk is a shard with its own random streams, so a seeded request
+        gives the same output however the shards are executed; map_shards
+        (default: map over generate_shard) may run them in parallel.
+        """
+        rows, schema, options = self._parse_params(rows, params)
+        seed = resolve_seed(params)
+        # Workers compile the same schema from its spec
+        spec = None if self.default_schema is not None else schema.spec
+        specs = (
+            {'seed': seed, 'index': i, 'start': start, 'rows': min(chunk_size, rows - start),
+             'schema': spec, 'options': options}
+            for i, start in enumerate(range(0, rows, chunk_size))
+        )
+        yield from (map_shards or self._map_shards)(specs)
+
+    def _map_shards(self, specs):
+        return map(self.generate_shard, specs)
+
+    def generate_shard(self, spec: Dict) -> pd.DataFrame:
+        schema = self.get_schema({'schema': spec['schema']} if spec.get('schema') else None)
+        return schema.sample(spec['rows'], spec['start'], spec['seed'], spec['index'], spec['options'])
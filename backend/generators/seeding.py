@@ -0,0 +1,26 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+
+def resolve_seed(params: Optional[Dict]) -> int:
+    """The request's `seed` param, or fresh OS entropy when none was given."""
+    seed = (params or {}).get('seed')
+    if seed is None:
+        # Kept within 53 bits so it survives a round trip through JSON clients
+        return int(np.random.SeedSequence().entropy % 2 ** 53)
+    seed = int(seed)
+    if seed < 0:
+        raise ValueError("seed must be a non-negative integer")
+    return seed
+
+
+def stream_rng(seed: int, *key: int) -> np.random.Generator:
+    """
+    Independent random stream for one shard of a seeded run.
+
+    Equivalent to SeedSequence(seed).spawn(...)[key], so the stream depends
+    only on the seed and the key, never on which process draws from it or
+    in what order shards run.
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=key))
@@ -0,0 +1,200 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Functions listed in a profile summary
+PROFILE_TOP_FUNCTIONS = 30
+
+
+class StageTimer:
+    """
+    Wall time and row counts of one generation, per stage.
+
+    Stages are exclusive: time spent in a stage nested inside another (e.g.
+    generating the chunks that a writer stage pulls) is only counted for the
+    inner one. Timing costs two perf_counter() calls per chunk and stage.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = {}
+        self.rows = {}
+        self._recorded = 0.0
+
+    def _add(self, stage, start, recorded_before):
+        elapsed = time.perf_counter() - start
+        own = elapsed - (self._recorded - recorded_before)
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + own
+        self._recorded += own
+
+    @contextmanager
+    def stage(self, name: str):
+        start, recorded = time.perf_counter(), self._recorded
+        try:
+            yield
+        finally:
+            self._add(name, start, recorded)
+
+    def timed(self, items: Iterable, name: str) -> Iterator:
+        """Pass items through, counting the time spent producing each one as stage `name`."""
+        items = iter(items)
+        while True:
+            start, recorded = time.perf_counter(), self._recorded
+            try:
+                item = next(items)
+            except StopIteration:
+                self._add(name, start, recorded)
+                return
+            self._add(name, start, recorded)
+            yield item
+
+    def count(self, table: Optional[str], rows: int) -> None:
+        table = table or 'data'
+        self.rows[table] = self.rows.get(table, 0) + rows
+
+    def result(self) -> Dict:
+        return {
+            'total_seconds': round(time.perf_counter() - self.started, 6),
+            'stages': {stage: round(seconds, 6) for stage, seconds in self.seconds.items()},
+            'rows': dict(self.rows)
+        }
+
+
+def profiled(items: Iterable, profiler: cProfile.Profile) -> Iterator:
+    """
+    Pass items through with the profiler enabled only while each one is being
+    produced, so a lazily consumed stream can be profiled across threads.
+    """
+    items = iter(items)
+    while True:
+        profiler.enable()
+        try:
+            item = next(items)
+        except StopIteration:
+            return
+        finally:
+            profiler.disable()
+        yield item
+
+
+def profile_summary(profiler: cProfile.Profile, limit: int = PROFILE_TOP_FUNCTIONS) -> str:
+    """The profiler's hottest functions by cumulative time, as pstats text."""
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ''
+    pairs = (f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + ','.join(pairs) + '}'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, labels: Tuple, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class _Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, labels: Tuple, value: float) -> None:
+        counts, total = self.values.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+        counts[bisect_left(self.buckets, value)] += 1
+        self.values[labels] = (counts, total + value)
+
+    def samples(self):
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                bucket_labels = _labels(self.labels + ('le',), labels + (bound,))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+class Metrics:
+    """
+    Process-wide generation metrics in the Prometheus text exposition format.
+
+    Jobs report their StageTimer results back to the web process, which
+    records them here; nothing is shared between processes.
+    """
+
+    def __init__(self, prefix: str = 'datagen'):
+        self._lock = threading.Lock()
+        self.requests = _Histogram(
+            f'{prefix}_request_duration_seconds',
+            'Time to answer a /generate request (job submission, cache hit or whole stream)',
+            ('method', 'mode'))
+        self.generations = _Histogram(
+            f'{prefix}_generation_duration_seconds',
+            'Wall time of finished generations', ('method', 'status'))
+        self.stage_seconds = _Counter(
+            f'{prefix}_stage_seconds_total',
+            'Wall time spent per generation stage', ('method', 'stage'))
+        self.rows = _Counter(
+            f'{prefix}_rows_total',
+            'Rows generated, per table', ('method', 'table'))
+
+    def record_request(self, method: str, mode: str, seconds: float) -> None:
+        with self._lock:
+            self.requests.observe((method, mode), seconds)
+
+    def record_generation(self, method: str, status: str, timings: Optional[Dict]) -> None:
+        """Record a finished generation from its StageTimer.result()."""
+        if not timings:
+            return
+        with self._lock:
+            self.generations.observe((method, status), timings['total_seconds'])
+            for stage, seconds in timings['stages'].items():
+                self.stage_seconds.inc((method, stage), seconds)
+            for table, rows in timings['rows'].items():
+                self.rows.inc((method, table), rows)
+
+    def render(self, gauges: Optional[Dict[str, Tuple[str, float]]] = None) -> str:
+        """The metrics as exposition text; gauges adds {name: (help, value)} read at scrape time."""
+        lines = []
+        with self._lock:
+            for metric in (self.requests, self.generations, self.stage_seconds, self.rows):
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric.samples())
+        for name, (help, value) in (gauges or {}).items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,589 @@
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from generators.agent_based import WINDOW_END
+from instrumentation import StageTimer
+from tasks import run_generation
+from writers import FORMATS
+
+logger = logging.getLogger(__name__)
+
+
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+# Seconds between scans of the store for expired jobs
+EXPIRE_INTERVAL = 60
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class JobStore:
+    """
+    Persistence for job records, shared by the web process and the workers.
+
+    LocalJobStore keeps everything on the local filesystem; a store backed by
+    Redis or a database only has to implement the same nine methods.
+    Checkpoints are opaque picklable dicts, one (the latest) per job.
+    """
+
+    def save(self, job: Dict) -> None:
+        raise NotImplementedError
+
+    def load(self, job_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def request_cancel(self, job_id: str) -> None:
+        raise NotImplementedError
+
+    def cancel_requested(self, job_id: str) -> bool:
+        raise NotImplementedError
+
+    def save_checkpoint(self, job_id: str, checkpoint: Dict) -> None:
+        raise NotImplementedError
+
+    def load_checkpoint(self, job_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def release(self, job_id: str, keep_checkpoint: bool = False) -> None:
+        """Drop a finished job's cancel flag, and its checkpoint unless it is kept for a resume."""
+        raise NotImplementedError
+
+    def expire(self, max_age: float) -> int:
+        """Delete finished jobs and batches untouched for max_age seconds; returns how many."""
+        raise NotImplementedError
+
+
+class LocalJobStore(JobStore):
+    """
+    One JSON file per job, replaced atomically; cancellation is a flag file
+    and the latest checkpoint a pickle, also replaced atomically.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, job_id, ext='json'):
+        if not job_id.isalnum():
+            raise ValueError(f"Invalid job id: {job_id}")
+        return os.path.join(self.root, f"{job_id}.{ext}")
+
+    def save(self, job):
+        path = self._path(job['id'])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def load(self, job_id):
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def update(self, job_id, **fields):
+        job = self.load(job_id)
+        if job is None:
+            return None
+        job.update(fields)
+        self.save(job)
+        return job
+
+    def request_cancel(self, job_id):
+        open(self._path(job_id, 'cancel'), 'w').close()
+
+    def cancel_requested(self, job_id):
+        return os.path.exists(self._path(job_id, 'cancel'))
+
+    def save_checkpoint(self, job_id, checkpoint):
+        path = self._path(job_id, 'checkpoint')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load_checkpoint(self, job_id):
+        try:
+            with open(self._path(job_id, 'checkpoint'), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _remove(self, job_id, *exts):
+        for ext in exts:
+            try:
+                os.remove(self._path(job_id, ext))
+            except FileNotFoundError:
+                pass
+
+    def release(self, job_id, keep_checkpoint=False):
+        self._remove(job_id, 'cancel', *(() if keep_checkpoint else ('checkpoint',)))
+
+    def expire(self, max_age):
+        cutoff = time.time() - max_age
+        expired = 0
+        for entry in os.scandir(self.root):
+            job_id, _, ext = entry.name.partition('.')
+            if ext not in ('json', 'cancel', 'checkpoint'):
+                continue
+            try:
+                if entry.stat().st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                # Removed with its job, earlier in this scan or by another process
+                continue
+            if ext == 'json':
+                job = self.load(job_id)
+                if job is None or (job.get('kind') != 'batch' and job.get('status') not in FINAL_STATUSES):
+                    continue
+                expired += 1
+                self._remove(job_id, 'json', 'cancel', 'checkpoint')
+            elif not os.path.exists(self._path(job_id)):
+                # Left behind by a record already gone
+                self._remove(job_id, ext)
+        return expired
+
+
+def _checkpointer(store, job_id):
+    """
+    Record each window checkpoint of a timeseries run under job_id, with the
+    archive holding the windows so far; it is kept if the run stops early.
+    """
+    def on_checkpoint(checkpoint, filename=None):
+        store.save_checkpoint(job_id, checkpoint)
+        fields = {'windows_done': checkpoint['windows_done'], 'windows_total': checkpoint['windows']}
+        if filename:
+            fields['file'] = filename
+        store.update(job_id, **fields)
+    return on_checkpoint
+
+
+def _finish(store, job_id, status, **fields):
+    """Record a job's final status and drop the run state it no longer needs."""
+    job = store.update(job_id, status=status, finished_at=_now(), **fields)
+    # A cancelled or failed timeseries run can still be resumed from its checkpoint
+    store.release(job_id, keep_checkpoint=status != 'completed')
+    return job
+
+
+def _run_job(store, job_id, method, rows, params, chunk_size, fmt, workers=1, profile=False, resume_from=None):
+    """
+    Worker entry point: runs one generation and records its outcome in the
+    store. resume_from continues a timeseries run from that job's checkpoint.
+    """
+    if store.cancel_requested(job_id):
+        _finish(store, job_id, 'cancelled')
+        return
+
+    store.update(job_id, status='running', started_at=_now())
+
+    def on_progress(rows_done):
+        if store.cancel_requested(job_id):
+            raise JobCancelled()
+        store.update(job_id, rows_done=rows_done)
+
+    timer = StageTimer()
+    try:
+        checkpoint = None
+        if resume_from:
+            checkpoint = store.load_checkpoint(resume_from)
+            if checkpoint is None:
+                raise ValueError(f"Job {resume_from} has no checkpoint")
+        result = run_generation(method, rows, params, chunk_size, on_progress, tag=job_id[:8], fmt=fmt, workers=workers,
+                                profile=profile, checkpoint=checkpoint, on_checkpoint=_checkpointer(store, job_id),
+                                timer=timer)
+    except JobCancelled:
+        _finish(store, job_id, 'cancelled', timings=timer.result())
+        return
+    except Exception as e:
+        _finish(store, job_id, 'failed', error=str(e), timings=timer.result())
+        return
+
+    _finish(
+        store,
+        job_id,
+        'completed',
+        rows_done=result['rows'],
+        file=result['file'],
+        preview_data=result['preview_data'],
+        sampling=result.get('sampling'),
+        timings=result['timings'],
+        profile=result.get('profile')
+    )
+
+
+def _new_job(method, rows, params, fmt, status, **fields):
+    return {
+        'id': uuid.uuid4().hex,
+        'method': method,
+        'status': status,
+        'rows_total': int(rows),
+        'rows_done': 0,
+        'params': params,
+        'format': fmt,
+        'created_at': _now(),
+        **fields
+    }
+
+
+def _tracked(store, job_id, chunks, stats, count_table=None, timer=None):
+    rows_done = 0
+    timer = timer or StageTimer()
+    try:
+        for item in chunks:
+            # DELETE /jobs/<id> only sets the flag; the response is cut short here
+            if store.cancel_requested(job_id):
+                raise JobCancelled()
+            # Multi-table generators yield (table, DataFrame) pairs
+            table, chunk = item if isinstance(item, tuple) else (None, item)
+            if table == WINDOW_END:
+                yield item
+                continue
+            timer.count(table, len(chunk))
+            with timer.stage('preview'):
+                stats.update(chunk, table)
+            if table == count_table:
+                rows_done += len(chunk)
+                store.update(job_id, rows_done=rows_done)
+            yield item
+    except (GeneratorExit, JobCancelled):
+        # Cancelled, or the client went away before the end of the response
+        _finish(store, job_id, 'cancelled')
+        raise
+    except Exception as e:
+        _finish(store, job_id, 'failed', error=str(e))
+        raise
+    _finish(store, job_id, 'completed', preview_data=stats.result())
+
+
+class JobQueue:
+    """
+    Runs generation jobs on an executor with bounded concurrency.
+
+    Concurrency is bounded by the executor's worker count and the backlog by
+    max_pending (queued plus running jobs). Batch jobs beyond that backlog,
+    up to max_held in all, are held here and submitted as jobs finish. Any
+    concurrent.futures.Executor can be passed in place of the default
+    process pool.
+
+    Jobs submitted with a cache_key that matches a job still in progress are
+    coalesced into it. Finished jobs and batches are deleted from the store
+    once untouched for max_age seconds, checked at most every EXPIRE_INTERVAL. on_complete(job) is called in this process whenever a
+    job completes, and on_finish(job) whenever a job it ran ends, whatever
+    its status.
+    """
+
+    def __init__(self, store: JobStore, max_workers: int, max_pending: int, executor=None,
+                 on_complete: Optional[Callable[[Dict], None]] = None,
+                 on_finish: Optional[Callable[[Dict], None]] = None, max_held: int = 0,
+                 max_age: Optional[float] = None):
+        self.store = store
+        self.max_pending = max_pending
+        self.max_held = max_held
+        self.max_age = max_age
+        self._expired_at = 0.0
+        self.executor = executor or ProcessPoolExecutor(max_workers=max_workers)
+        self.on_complete = on_complete
+        self.on_finish = on_finish
+        self._futures = {}
+        self._keys = {}
+        # (job id, _run_job arguments) of held batch jobs, in submission order
+        self._held = deque()
+        # Reentrant: a done callback may run in the thread that added it
+        self._lock = threading.RLock()
+
+    def submit(self, method: str, rows: int, params: Dict, chunk_size: int, fmt: str = 'csv',
+               workers: int = 1, cache_key: Optional[str] = None, profile: bool = False,
+               resume_from: Optional[str] = None) -> Dict:
+        self._expire_due()
+        with self._lock:
+            self._prune()
+            return self._submit(method, rows, params, chunk_size, fmt, workers, cache_key, profile, resume_from)
+
+    def expire(self) -> int:
+        """Delete finished jobs older than max_age from the store; returns how many."""
+        self._expired_at = time.monotonic()
+        return self.store.expire(self.max_age) if self.max_age is not None else 0
+
+    def _expire_due(self):
+        if time.monotonic() - self._expired_at >= EXPIRE_INTERVAL:
+            self.expire()
+
+    def _prune(self):
+        self._futures = {k: f for k, f in self._futures.items() if not f.done()}
+        held = {job_id for job_id, _ in self._held}
+        self._keys = {k: job_id for k, job_id in self._keys.items() if job_id in self._futures or job_id in held}
+
+    def _submit(self, method, rows, params, chunk_size, fmt='csv', workers=1, cache_key=None, profile=False,
+                resume_from=None, hold=False):
+        if cache_key in self._keys:
+            return self.store.load(self._keys[cache_key])
+        if len(self._futures) >= self.max_pending and not hold:
+            raise QueueFull(f"Too many pending jobs (limit {self.max_pending})")
+
+        job = _new_job(method, rows, params, fmt, status='queued', workers=workers, cache_key=cache_key,
+                       profiled=profile, chunk_size=chunk_size, resumed_from=resume_from)
+        self.store.save(job)
+        args = (method, rows, params, chunk_size, fmt, workers, profile, resume_from)
+        if len(self._futures) >= self.max_pending:
+            self._held.append((job['id'], args))
+        else:
+            self._start(job['id'], args)
+        if cache_key:
+            self._keys[cache_key] = job['id']
+        return job
+
+    def _start(self, job_id, args):
+        future = self.executor.submit(_run_job, self.store, job_id, *args)
+        self._futures[job_id] = future
+        future.add_done_callback(partial(self._on_done, job_id))
+
+    def _release(self):
+        """Submit held batch jobs while the backlog has room."""
+        with self._lock:
+            self._prune()
+            while self._held and len(self._futures) < self.max_pending:
+                job_id, args = self._held.popleft()
+                if self.store.cancel_requested(job_id):
+                    _finish(self.store, job_id, 'cancelled')
+                    continue
+                self._start(job_id, args)
+
+    def record_cached(self, method: str, params: Dict, fmt: str, entry: Dict) -> Dict:
+        """Record a request answered from the result cache as an already completed job."""
+        self._expire_due()
+        job = _new_job(
+            method, entry['rows'], params, fmt, status='completed', cache_key=entry['key'], cached=True,
+            rows_done=entry['rows'], file=entry['file'], preview_data=entry['preview_data'],
+            sampling=entry['sampling'], finished_at=_now()
+        )
+        self.store.save(job)
+        return job
+
+    def track_stream(self, method: str, rows: int, params: Dict, fmt: str, chunks: Iterable,
+                     stats, count_table: Optional[str] = None, timer: Optional[StageTimer] = None,
+                     profile: bool = False) -> Tuple[Dict, Iterator]:
+        """
+        Record a response streamed from the web process as a job, so its progress
+        and preview statistics can be read from /jobs/<id> like any other job.
+
+        Returns the job and a pass-through iterator over chunks that feeds them
+        to stats and stores the preview once the last chunk has been sent.
+        For (table, DataFrame) chunks, progress counts the rows of count_table.
+        Rows and preview time are counted on timer, if given.
+        """
+        self._expire_due()
+        job = _new_job(method, rows, params, fmt, status='running', streamed=True, started_at=_now(),
+                       profiled=profile)
+        self.store.save(job)
+        return job, _tracked(self.store, job['id'], chunks, stats, count_table, timer)
+
+    def resume(self, job_id: str, chunk_size: int) -> Optional[Dict]:
+        """
+        Continue a cancelled or failed timeseries job from its last checkpoint
+        as a new job, whose archive holds the remaining windows. Raises
+        ValueError if the job cannot be resumed.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job['status'] not in ('cancelled', 'failed'):
+            raise ValueError(f"Job is {job['status']}; only cancelled or failed jobs can be resumed")
+        # A resumed job stopped before its first window continues from its predecessor's checkpoint
+        source = job
+        while source is not None and self.store.load_checkpoint(source['id']) is None:
+            source = self.store.load(source['resumed_from']) if source.get('resumed_from') else None
+        if source is None:
+            raise ValueError("Job has no checkpoint to resume from")
+        return self.submit(job['method'], job['rows_total'], job['params'], job.get('chunk_size', chunk_size),
+                           job['format'], job.get('workers', 1), resume_from=source['id'])
+
+    def checkpointer(self, job_id: str) -> Callable[[Dict], None]:
+        """The on_checkpoint callback recording a streamed timeseries job's checkpoints."""
+        return _checkpointer(self.store, job_id)
+
+    def submit_batch(self, items: List[Dict]) -> Dict:
+        """
+        Queue the jobs of a batch and record it, see get_batch().
+
+        Each item is a dict of submit() arguments (method, rows, params,
+        chunk_size, format, workers, cache_key) plus its name. An item may
+        instead already have a job_id, e.g. a cached result, or be the
+        duplicate_of an earlier item's index and share its job. Jobs the
+        backlog has no room for are held and submitted as others finish;
+        either every new job is queued or held or, if there is no room for
+        all of them, none is. Larger jobs are queued first, so that with
+        enough workers the batch takes about as long as its largest job.
+        """
+        self._expire_due()
+        with self._lock:
+            self._prune()
+            new = [item for item in items if 'job_id' not in item and 'duplicate_of' not in item]
+            keys = {item['cache_key'] for item in new if item.get('cache_key')}
+            needed = len(keys - self._keys.keys()) + sum(1 for item in new if not item.get('cache_key'))
+            room = max(self.max_pending - len(self._futures), 0) + self.max_held - len(self._held)
+            if needed > room:
+                raise QueueFull(f"Batch needs {needed} jobs but only {room} can be queued or held "
+                                f"(limits {self.max_pending} and {self.max_held})")
+            for item in sorted(new, key=lambda item: item['rows'], reverse=True):
+                job = self._submit(item['method'], item['rows'], item['params'], item['chunk_size'],
+                                   item['format'], item['workers'], item.get('cache_key'), hold=True)
+                item['job_id'] = job['id']
+
+        records = []
+        for item in items:
+            record = {'name': item['name'], 'job_id': item.get('job_id')}
+            if 'duplicate_of' in item:
+                record['job_id'] = items[item['duplicate_of']]['job_id']
+                record['duplicate_of'] = item['duplicate_of']
+            records.append(record)
+        batch = {'id': uuid.uuid4().hex, 'kind': 'batch', 'items': records, 'created_at': _now()}
+        self.store.save(batch)
+        return batch
+
+    def get_batch(self, batch_id: str) -> Optional[Dict]:
+        """
+        A batch with its manifest: per item, its job's status and, once
+        completed, the output file and its path in the batch archive
+        (duplicates share the path of the item they repeat).
+        """
+        batch = self.store.load(batch_id)
+        if batch is None or batch.get('kind') != 'batch':
+            return None
+
+        jobs = {}
+        manifest = []
+        for item in batch['items']:
+            if item['job_id'] not in jobs:
+                jobs[item['job_id']] = self.store.load(item['job_id'])
+            job = jobs[item['job_id']]
+            if job is None:
+                # Expired with its batch
+                return None
+            original = batch['items'][item.get('duplicate_of', len(manifest))]
+            entry = {
+                'name': item['name'],
+                'job_id': job['id'],
+                'method': job['method'],
+                'status': job['status'],
+                'rows': job['rows_done'],
+                'seed': job['params'].get('seed'),
+                'format': job['format'],
+                'cached': job.get('cached', False),
+                'file': None,
+                'path': None,
+                'preview_data': job.get('preview_data'),
+            }
+            if 'duplicate_of' in item:
+                entry['duplicate_of'] = original['name']
+            if job.get('error'):
+                entry['error'] = job['error']
+            if job['status'] == 'completed':
+                ext = '.zip' if job['file'].endswith('.zip') else FORMATS[job['format']]
+                entry['file'] = job['file']
+                entry['path'] = f"{original['name']}{ext}"
+            manifest.append(entry)
+
+        statuses = [job['status'] for job in jobs.values()]
+        if not all(status in FINAL_STATUSES for status in statuses):
+            status = 'queued' if all(status == 'queued' for status in statuses) else 'running'
+        else:
+            status = 'completed' if all(status == 'completed' for status in statuses) else 'failed'
+        rows_total = sum(job['rows_total'] for job in jobs.values())
+        rows_done = sum(min(job['rows_done'], job['rows_total']) for job in jobs.values())
+        return {
+            **batch,
+            'status': status,
+            'progress': rows_done / rows_total if rows_total else float(status == 'completed'),
+            'items': manifest
+        }
+
+    def cancel_batch(self, batch_id: str) -> Optional[Dict]:
+        batch = self.store.load(batch_id)
+        if batch is None or batch.get('kind') != 'batch':
+            return None
+        for job_id in dict.fromkeys(item['job_id'] for item in batch['items']):
+            self.cancel(job_id)
+        return self.get_batch(batch_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.store.load(job_id)
+        # Batches share the store but are read through get_batch()
+        if job is not None and job.get('kind') == 'batch':
+            return None
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        job = self.get(job_id)
+        if job is None or job['status'] in FINAL_STATUSES:
+            return job
+
+        with self._lock:
+            held = [entry for entry in self._held if entry[0] == job_id]
+            for entry in held:
+                self._held.remove(entry)
+        if held:
+            return _finish(self.store, job_id, 'cancelled')
+
+        future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            return _finish(self.store, job_id, 'cancelled')
+
+        # Already running (or owned by another process): the worker checks this flag between chunks
+        self.store.request_cancel(job_id)
+        job['cancel_requested'] = True
+        return job
+
+    def _on_done(self, job_id, future):
+        self._release()
+        if future.cancelled():
+            return
+        # Failures inside the generation are recorded by the worker itself; this
+        # only catches jobs that never reported back, e.g. a crashed worker process.
+        if future.exception() is not None:
+            job = _finish(self.store, job_id, 'failed', error=str(future.exception()))
+        else:
+            job = self.store.load(job_id)
+        if job is None:
+            return
+        if job['status'] == 'completed':
+            self._call_hook(self.on_complete, job)
+        self._call_hook(self.on_finish, job)
+
+    @staticmethod
+    def _call_hook(hook, job):
+        if hook is None:
+            return
+        try:
+            hook(job)
+        except Exception as e:
+            logger.error("Error in job completion hook: %s", e)
+
+
+def progress(job: Dict) -> float:
+    if not job.get('rows_total'):
+        return 1.0 if job['status'] == 'completed' else 0.0
+    return min(job['rows_done'] / job['rows_total'], 1.0)
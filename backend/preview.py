@@ -0,0 +1,144 @@
+import json
+import math
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from writers import format_ids
+
+
+class CountMap:
+    """Running value counts of one column, most frequent first."""
+
+    def __init__(self, column: str, table: Optional[str] = None):
+        self.column = column
+        self.table = table
+        self.counts = {}
+
+    def update(self, values: pd.Series) -> None:
+        for key, count in values.value_counts().items():
+            # Categorical columns also count the categories that did not occur
+            if count:
+                self.counts[key] = self.counts.get(key, 0) + int(count)
+
+    def result(self) -> Dict:
+        ordered = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        # Keys must survive JSON (job records): no numpy scalars
+        return {(key.item() if isinstance(key, np.generic) else key): count for key, count in ordered}
+
+
+class Histogram:
+    """
+    Histogram over a range fixed up front, so memory does not grow with the data.
+
+    Values are counted into `resolution` equal-width bins over [low, high);
+    values outside the range fall into the end bins. result() drops empty
+    bins at both ends and merges the rest into at most `bins` ranges, so the
+    preview spans the data actually seen, much like pd.cut over the data.
+    With integer=True bins are whole numbers and labels are inclusive ("18-22").
+    """
+
+    def __init__(self, column: str, low: float, high: float, bins: int = 10,
+                 resolution: int = 200, integer: bool = False, table: Optional[str] = None):
+        if integer:
+            low, high = int(math.floor(low)), int(math.ceil(high))
+            resolution = high - low
+        if high <= low or resolution < 1:
+            raise ValueError(f"Invalid histogram range for {column}: [{low}, {high})")
+        self.column = column
+        self.table = table
+        self.low = low
+        self.width = (high - low) / resolution
+        self.bins = bins
+        self.integer = integer
+        self.counts = np.zeros(resolution, dtype=np.int64)
+
+    def update(self, values: pd.Series) -> None:
+        index = np.floor((values.to_numpy(dtype=float) - self.low) / self.width)
+        index = np.clip(index, 0, len(self.counts) - 1).astype(np.int64)
+        self.counts += np.bincount(index, minlength=len(self.counts))
+
+    def result(self) -> Dict:
+        filled = np.flatnonzero(self.counts)
+        if not len(filled):
+            return {}
+        first, last = filled[0], filled[-1] + 1
+        group = -(-(last - first) // self.bins)
+
+        distribution = {}
+        for start in range(first, last, group):
+            stop = min(start + group, last)
+            low = self.low + start * self.width
+            high = self.low + stop * self.width
+            if self.integer:
+                label = f"{int(low)}" if stop - start == 1 else f"{int(low)}-{int(high) - 1}"
+            else:
+                label = f"{low:.1f}-{high:.1f}"
+            distribution[label] = int(self.counts[start:stop].sum())
+        return distribution
+
+
+class Reservoir:
+    """
+    Uniform random sample of up to `size` rows of a stream of DataFrames
+    (reservoir sampling, vectorised per chunk). Only the sampled rows are
+    kept, as JSON-ready records.
+    """
+
+    def __init__(self, size: int, rng: np.random.Generator, table: Optional[str] = None):
+        self.size = size
+        self.rng = rng
+        self.table = table
+        self.seen = 0
+        self.slots = [None] * size
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        n = len(chunk)
+        positions = np.arange(n)
+        seen = self.seen + positions
+        # Row number t replaces a random slot with probability size / (t + 1)
+        slots = np.where(seen < self.size, seen, self.rng.integers(0, seen + 1))
+        keep = slots < self.size
+        self.seen += n
+        if not keep.any():
+            return
+
+        # A later row taking the same slot wins, as in the sequential algorithm
+        chosen = pd.Series(positions[keep], index=slots[keep])
+        chosen = chosen[~chosen.index.duplicated(keep='last')]
+        rows = format_ids(chunk.iloc[chosen.to_numpy()])
+        records = json.loads(rows.to_json(orient='records', date_format='iso'))
+        for slot, record in zip(chosen.index, records):
+            self.slots[slot] = record
+
+    def result(self):
+        return [record for record in self.slots if record is not None]
+
+
+class PreviewStats:
+    """
+    Preview statistics accumulated chunk by chunk while a dataset is generated.
+
+    `fields` maps preview keys to CountMap/Histogram accumulators, each bound to
+    a column and optionally to a table of a multi-table generator; `sample`
+    adds a reservoir of example rows under the 'sample' key. Memory is bounded
+    by the number of distinct values, bins and sampled rows, not by row count.
+    """
+
+    def __init__(self, fields: Dict, sample: Optional[Reservoir] = None):
+        self.fields = fields
+        self.sample = sample
+
+    def update(self, chunk: pd.DataFrame, table: Optional[str] = None) -> None:
+        for accumulator in self.fields.values():
+            if accumulator.table == table:
+                accumulator.update(chunk[accumulator.column])
+        if self.sample is not None and self.sample.table == table:
+            self.sample.update(chunk)
+
+    def result(self) -> Dict:
+        preview = {name: accumulator.result() for name, accumulator in self.fields.items()}
+        if self.sample is not None:
+            preview['sample'] = self.sample.result()
+        return preview
@@ -0,0 +1,133 @@
+import io
+import zipfile
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+from writers import FORMATS, _require_pyarrow
+
+
+def format_of(filename: str) -> str:
+    """The writers.FORMATS key of a generated file, from its extension."""
+    for fmt, ext in sorted(FORMATS.items(), key=lambda item: len(item[1]), reverse=True):
+        if filename.endswith(ext):
+            return fmt
+    raise ValueError(f"Unsupported file type: {filename}")
+
+
+def _archive_entries(archive: zipfile.ZipFile, table: str) -> List[str]:
+    """A table's entries in archive order: one, or one per window of a timeseries run."""
+    names = [name for name in archive.namelist() if name.startswith(f"ed_{table}_")]
+    if not names:
+        raise ValueError(f"No {table} table in archive")
+    return names
+
+
+def iter_pages(path: str, offset: int = 0, limit: Optional[int] = None, page_size: int = 10_000,
+               table: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read rows offset to offset + limit of a generated file as DataFrames of
+    at most page_size rows, without loading the whole file. Tables inside an
+    archive are chosen by name (patients, staff, resources); a table split
+    into windows is read as one.
+    """
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            names = _archive_entries(archive, table or 'patients')
+            if len(names) == 1:
+                with archive.open(names[0]) as entry:
+                    yield from _iter_stream(entry, format_of(names[0]), offset, limit, page_size)
+            else:
+                yield from _limited(_skipped(_entry_pages(archive, names, page_size), offset), limit)
+    else:
+        with open(path, 'rb') as f:
+            yield from _iter_stream(f, format_of(path), offset, limit, page_size)
+
+
+def _iter_stream(fileobj, fmt, offset, limit, page_size):
+    if fmt in ('csv', 'csv.gz', 'csv.zst', 'ndjson'):
+        pages = _text_pages(fileobj, fmt, offset, page_size)
+    else:
+        pages = _arrow_pages(fileobj, fmt, offset, page_size)
+    yield from _limited(pages, limit)
+
+
+def _entry_pages(archive, names, page_size):
+    for name in names:
+        with archive.open(name) as entry:
+            yield from _iter_stream(entry, format_of(name), 0, None, page_size)
+
+
+def _skipped(pages, offset):
+    for page in pages:
+        if offset >= len(page):
+            offset -= len(page)
+            continue
+        yield page.iloc[offset:]
+        offset = 0
+
+
+def _limited(pages, limit):
+    remaining = limit
+    for page in pages:
+        if remaining is not None:
+            if remaining <= 0:
+                return
+            page = page.iloc[:remaining]
+            remaining -= len(page)
+        if len(page):
+            yield page
+
+
+def _text_pages(fileobj, fmt, offset, page_size):
+    # Values are read back as written, without type or missing-value
+    # inference: "None" stays a string and pin codes keep their digits
+    if fmt == 'ndjson':
+        reader = pd.read_json(fileobj, lines=True, chunksize=page_size, dtype=False, convert_dates=False)
+    else:
+        compression = {'csv': None, 'csv.gz': 'gzip', 'csv.zst': 'zstd'}[fmt]
+        # Skipped rows are still scanned, but never parsed into frames; a
+        # callable, since pandas would turn a range into a set of every row
+        skip = offset
+        reader = pd.read_csv(fileobj, compression=compression, chunksize=page_size, dtype=str,
+                             keep_default_na=False, na_filter=False,
+                             skiprows=(lambda i: 0 < i <= skip) if offset else None)
+        offset = 0
+
+    with reader:
+        for page in reader:
+            if offset >= len(page):
+                offset -= len(page)
+                continue
+            yield page.iloc[offset:]
+            offset = 0
+
+
+def _arrow_pages(fileobj, fmt, offset, page_size):
+    pa = _require_pyarrow()
+    if not fileobj.seekable():
+        fileobj = io.BytesIO(fileobj.read())
+
+    if fmt == 'parquet':
+        parquet_file = pa.parquet.ParquetFile(fileobj)
+        # Whole row groups before the offset are skipped via the footer metadata
+        groups = []
+        for i in range(parquet_file.num_row_groups):
+            rows = parquet_file.metadata.row_group(i).num_rows
+            if offset >= rows and not groups:
+                offset -= rows
+            else:
+                groups.append(i)
+        batches = parquet_file.iter_batches(batch_size=page_size, row_groups=groups) if groups else []
+    else:
+        reader = pa.ipc.open_file(fileobj)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+    for batch in batches:
+        if offset >= batch.num_rows:
+            offset -= batch.num_rows
+            continue
+        batch = batch.slice(offset)
+        offset = 0
+        for start in range(0, batch.num_rows, page_size):
+            yield batch.slice(start, page_size).to_pandas()
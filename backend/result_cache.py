@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+def cache_key(method: str, rows: int, params: Dict, chunk_size: int, fmt: str, version=None) -> str:
+    """
+    Content address of a seeded generation request.
+
+    Output depends on the method, row count, params (including the seed),
+    chunk size and format; `version` covers anything else the output depends
+    on, e.g. the model file of the model method.
+    """
+    request = {
+        'method': method,
+        'rows': int(rows),
+        'params': params,
+        'chunk_size': int(chunk_size),
+        'format': fmt,
+        'version': version,
+    }
+    encoded = json.dumps(request, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache of generated datasets, plus LRU/size eviction of the output directory.
+
+    Each entry is a small JSON file in index_dir that maps a cache_key() to a
+    file in output_dir together with its preview data, so a repeated seeded
+    request is answered without generating anything. Output files' access
+    times (entries' modification times) record last use; hits and downloads
+    refresh them. File modification times are left alone, as downloads use
+    them for ETags.
+
+    evict() keeps output_dir under max_bytes and max_files by removing the
+    least recently used files, cached or not, but never files modified in
+    the last min_age seconds (results still being written or not yet
+    downloaded). Entries whose file is gone are dropped on lookup.
+    """
+
+    def __init__(self, output_dir: str, index_dir: str, max_bytes: int, max_files: int, min_age: float = 300):
+        self.output_dir = output_dir
+        self.index_dir = index_dir
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.min_age = min_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(index_dir, exist_ok=True)
+
+    def _entry_path(self, key):
+        if not key.isalnum():
+            raise ValueError(f"Invalid cache key: {key}")
+        return os.path.join(self.index_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entry = None
+
+        if entry is not None and not os.path.exists(os.path.join(self.output_dir, entry['file'])):
+            self._remove_quietly(path)
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self.touch(entry['file'])
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, job: Dict) -> Dict:
+        entry = {
+            'key': key,
+            'file': job['file'],
+            'rows': job['rows_done'],
+            'preview_data': job.get('preview_data'),
+            'sampling': job.get('sampling'),
+            'created_at': job.get('finished_at'),
+        }
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        return entry
+
+    def store_job(self, job: Dict) -> None:
+        """Completed-job hook: cache seeded results, then enforce the size limits."""
+        if job.get('cache_key') and job.get('file'):
+            self.put(job['cache_key'], job)
+        self.evict(keep=job.get('file'))
+
+    def touch(self, filename: str) -> None:
+        path = os.path.join(self.output_dir, filename)
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.output_dir):
+                if entry.is_file():
+                    stat = entry.stat()
+                    files.append((max(stat.st_atime, stat.st_mtime), stat.st_mtime, stat.st_size, entry.name))
+            files.sort()
+
+            total = sum(size for _, _, size, _ in files)
+            count = len(files)
+            cutoff = time.time() - self.min_age
+            removed = set()
+            for _, mtime, size, name in files:
+                if total <= self.max_bytes and count <= self.max_files:
+                    break
+                if name == keep or mtime > cutoff:
+                    continue
+                self._remove_quietly(os.path.join(self.output_dir, name))
+                removed.add(name)
+                total -= size
+                count -= 1
+
+            if removed:
+                self.evictions += len(removed)
+                self._drop_entries(removed)
+            return len(removed)
+
+    def _drop_entries(self, filenames):
+        for name in os.listdir(self.index_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.index_dir, name)
+            try:
+                with open(path) as f:
+                    if json.load(f).get('file') in filenames:
+                        self._remove_quietly(path)
+            except (OSError, ValueError):
+                continue
+
+    @staticmethod
+    def _remove_quietly(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def metrics(self) -> Dict:
+        sizes = [entry.stat().st_size for entry in os.scandir(self.output_dir) if entry.is_file()]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'evictions': self.evictions,
+            'entries': sum(1 for name in os.listdir(self.index_dir) if name.endswith('.json')),
+            'files': len(sizes),
+            'bytes': sum(sizes),
+            'max_bytes': self.max_bytes,
+            'max_files': self.max_files,
+        }
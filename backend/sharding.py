@@ -0,0 +1,33 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+
+def ordered_map(fn: Callable, items: Iterable, workers: int = 1,
+                window: Optional[int] = None) -> Iterator:
+    """
+    Like map(fn, items), but runs fn on a pool of worker processes.
+
+    Results are yielded in input order and at most `window` items (default
+    twice the worker count) are in flight at once, so a slow consumer, e.g.
+    a file writer, bounds memory rather than letting finished shards pile up.
+    With workers <= 1 this is a plain, lazy map in the calling process.
+    fn and the items must be picklable.
+    """
+    if workers <= 1:
+        yield from map(fn, items)
+        return
+
+    window = window or 2 * workers
+    executor = ProcessPoolExecutor(max_workers=workers)
+    in_flight = deque()
+    try:
+        for item in items:
+            in_flight.append(executor.submit(fn, item))
+            if len(in_flight) >= window:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+    finally:
+        # Also reached when the consumer stops early (cancelled job, failed write)
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,414 @@
+from datetime import datetime
+from generators.rule_based import RuleBasedGenerator
+from generators.statistical import StatisticalGenerator
+from generators.agent_based import AgentBasedGenerator, WINDOW_END
+from generators.model_based import ModelBasedGenerator
+from generators.schema_based import SchemaBasedGenerator
+from config import OUTPUT_DIR, SPOOL_MAX_BYTES
+from writers import FORMATS, TableWriter
+from generators.seeding import resolve_seed, stream_rng
+from preview import CountMap, Histogram, PreviewStats, Reservoir
+from instrumentation import StageTimer, profile_summary
+from sharding import ordered_map
+from functools import partial
+import numpy as np
+import cProfile
+import io
+import json
+import os
+import tempfile
+import time
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+
+
+GENERATOR_CLASSES = {
+    'rule': RuleBasedGenerator,
+    'statistical': StatisticalGenerator,
+    'agent': AgentBasedGenerator,
+    'model': ModelBasedGenerator,
+    'schema': SchemaBasedGenerator,
+}
+
+# Generators are created on first use, once per process
+_generators = {}
+
+
+def get_generator(method):
+    if method not in GENERATOR_CLASSES:
+        raise ValueError(f"Invalid method: {method}")
+    if method not in _generators:
+        _generators[method] = GENERATOR_CLASSES[method]()
+    return _generators[method]
+
+
+def _run_shard(method, spec):
+    return get_generator(method).generate_shard(spec)
+
+
+def shard_mapper(method, workers=1):
+    """The map_shards of a generator's iter_chunks: its shards run on up to `workers` processes."""
+    return partial(ordered_map, partial(_run_shard, method), workers=workers)
+
+
+# Bytes copied at a time from a spooled archive table
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# Example rows kept in each preview
+PREVIEW_SAMPLE_ROWS = 20
+# Integer schema columns with at most this many values get one preview bin per value
+PREVIEW_INTEGER_BINS = 1000
+
+
+def preview_stats(method, params=None):
+    """The preview accumulators for one generation with the given method."""
+    generator = get_generator(method)
+    # The unkeyed stream of the seed; generators only draw from keyed ones
+    sample = Reservoir(PREVIEW_SAMPLE_ROWS, stream_rng(resolve_seed(params)),
+                       table='patients' if method == 'agent' else None)
+
+    if method == 'rule':
+        fields = {
+            'state_distribution': CountMap('state'),
+            'age_distribution': Histogram('age', 0, generator.max_occupation_age + 1, integer=True),
+            'occupation_distribution': CountMap('occupation')
+        }
+    elif method == 'statistical':
+        # Five standard deviations either side of both sexes' mean height
+        spread = 5 * np.sqrt([generator.male_cov[0, 0], generator.female_cov[0, 0]])
+        means = np.array([generator.male_means[0], generator.female_means[0]])
+        fields = {
+            'height_distribution': Histogram('height', (means - spread).min(), (means + spread).max()),
+            'sex_distribution': CountMap('sex')
+        }
+    elif method == 'agent':
+        fields = {
+            'triage_distribution': CountMap('triage_level', table='patients'),
+            'disposition_distribution': CountMap('disposition', table='patients'),
+            'resource_usage': CountMap('resource_id', table='resources')
+        }
+        if generator.windowed(params):
+            fields['department_distribution'] = CountMap('department', table='patients')
+    elif method == 'model':
+        fields = {
+            'hazard_distribution': CountMap('Hazardous')
+        }
+    elif method == 'schema':
+        fields = _schema_preview_fields(generator.get_schema(params))
+    else:
+        raise ValueError(f"Invalid method: {method}")
+    return PreviewStats(fields, sample)
+
+
+def _schema_preview_fields(schema):
+    """Value counts of the categorical columns and histograms of the bounded integer ones."""
+    fields = {}
+    for name, column in schema.columns.items():
+        if not column.output or column.domain is None:
+            continue
+        if column.categorical:
+            fields[f'{name}_distribution'] = CountMap(name)
+        else:
+            low, high = column.bounds
+            fields[f'{name}_distribution'] = Histogram(name, low, high + 1,
+                                                       integer=column.domain <= PREVIEW_INTEGER_BINS)
+    return fields
+
+
+def _write_table(chunks, filepath, fmt, on_chunk=None, on_progress=None, timer=None):
+    """Append each chunk to the output file so only one chunk is held in memory."""
+    timer = timer or StageTimer()
+    with open(filepath, 'wb') as f:
+        writer = TableWriter(f, fmt)
+        for chunk in timer.timed(chunks, 'generate'):
+            timer.count(None, len(chunk))
+            if on_chunk:
+                with timer.stage('preview'):
+                    on_chunk(chunk)
+            with timer.stage('write'):
+                writer.write(chunk)
+            if on_progress:
+                on_progress(writer.rows)
+        with timer.stage('write'):
+            writer.close()
+    return writer.rows
+
+
+def _remove_quietly(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _archive_entries(suffix, ext):
+    return {
+        'patients': f"ed_patients_{suffix}{ext}",
+        'staff': f"ed_staff_{suffix}{ext}",
+        'resources': f"ed_resources_{suffix}{ext}"
+    }
+
+
+def _archive_compression(fmt):
+    # Parquet and compressed CSV are already compressed
+    return ZIP_DEFLATED if fmt in ('csv', 'ndjson', 'feather') else ZIP_STORED
+
+
+def _write_archive(zipf, chunks, fmt, files):
+    """
+    Write the agent method's (table, DataFrame) chunks into an open archive,
+    yielding each chunk once it has been written, and None at the other
+    points where the output may be flushed. Entries are written in order,
+    so the archive may be an unseekable stream.
+    """
+    # The staff table always comes first
+    table, df_staff = next(chunks)
+    with zipf.open(files['staff'], 'w') as entry:
+        writer = TableWriter(entry, fmt)
+        writer.write(df_staff)
+        writer.close()
+    yield table, df_staff
+
+    # Only one archive entry can be open at a time, so resource chunks,
+    # which arrive interleaved with patient chunks, are encoded into an
+    # in-memory buffer (spilling to disk only past SPOOL_MAX_BYTES)
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as resources_buffer:
+        resources_writer = TableWriter(resources_buffer, fmt)
+        with zipf.open(files['patients'], 'w', force_zip64=True) as entry:
+            patients_writer = TableWriter(entry, fmt)
+            for table, chunk in chunks:
+                (patients_writer if table == 'patients' else resources_writer).write(chunk)
+                yield table, chunk
+            patients_writer.close()
+        resources_writer.close()
+
+        resources_buffer.seek(0)
+        with zipf.open(files['resources'], 'w', force_zip64=True) as entry:
+            for block in iter(lambda: resources_buffer.read(COPY_BLOCK_SIZE), b''):
+                entry.write(block)
+                yield None
+
+
+def _write_windowed_archive(zipf, chunks, fmt, suffix, ext, on_checkpoint=None):
+    """
+    Write the agent method's timeseries chunks into an open archive, one
+    entry per table and output window, named by the window's first day
+    (ed_patients_<suffix>_<YYYYMMDD>.csv). Each window is spooled until its
+    WINDOW_END marker and only then copied in, so an archive closed early
+    still holds whole windows only; on_checkpoint(checkpoint) is called once
+    they are in. Yields like _write_archive.
+    """
+    spools = {}
+    try:
+        for table, chunk in chunks:
+            if table != WINDOW_END:
+                if table not in spools:
+                    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+                    spools[table] = (spool, TableWriter(spool, fmt))
+                spools[table][1].write(chunk)
+                yield table, chunk
+                continue
+
+            for name, (spool, writer) in spools.items():
+                writer.close()
+                spool.seek(0)
+                with zipf.open(f"ed_{name}_{suffix}_{chunk['window_start']}{ext}", 'w', force_zip64=True) as entry:
+                    for block in iter(lambda: spool.read(COPY_BLOCK_SIZE), b''):
+                        entry.write(block)
+                        yield None
+                spool.close()
+            spools = {}
+            if on_checkpoint:
+                on_checkpoint(chunk)
+            yield None
+    finally:
+        for spool, _ in spools.values():
+            spool.close()
+
+
+class _PipeSink(io.RawIOBase):
+    """Unseekable write target whose contents are taken out piece by piece."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def iter_archive(chunks, fmt, suffix, windowed=False, on_checkpoint=None):
+    """
+    Encode the agent method's (table, DataFrame) chunks as a zip archive on
+    the fly, yielding bytes after every chunk; nothing touches the disk
+    except resource rows past SPOOL_MAX_BYTES. Timeseries chunks (windowed)
+    are written per window, calling on_checkpoint after each one.
+    """
+    sink = _PipeSink()
+    with ZipFile(sink, 'w', _archive_compression(fmt)) as zipf:
+        if windowed:
+            written = _write_windowed_archive(zipf, chunks, fmt, suffix, FORMATS[fmt], on_checkpoint)
+        else:
+            written = _write_archive(zipf, chunks, fmt, _archive_entries(suffix, FORMATS[fmt]))
+        for _ in written:
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def iter_batch_archive(manifest, members):
+    """
+    A batch's datasets as one zip archive streamed from their files, after
+    its manifest.json. members are (path in archive, file path, format)
+    triples; agent archives are nested as they are.
+    """
+    sink = _PipeSink()
+    with ZipFile(sink, 'w', ZIP_DEFLATED) as zipf:
+        zipf.writestr('manifest.json', json.dumps(manifest, indent=2, default=str))
+        yield sink.drain()
+        for name, filepath, fmt in members:
+            info = ZipInfo(name, time.localtime(os.path.getmtime(filepath))[:6])
+            info.compress_type = ZIP_STORED if filepath.endswith('.zip') else _archive_compression(fmt)
+            with open(filepath, 'rb') as f, zipf.open(info, 'w', force_zip64=True) as entry:
+                for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+                    entry.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+    yield sink.drain()
+
+
+def run_generation(method, rows, params, chunk_size, on_progress=None, tag=None, fmt='csv', workers=1,
+                   profile=False, checkpoint=None, on_checkpoint=None, timer=None):
+    """
+    Generate a dataset into OUTPUT_DIR chunk by chunk, in one of writers.FORMATS.
+
+    Chunks are generated as seeded shards on up to `workers` processes and
+    written in order; for a given `seed` param and chunk size the output is
+    the same whatever the worker count.
+
+    on_progress(rows_done) is called after every chunk and may raise to abort the
+    run; partial output is removed in that case. Returns a dict with the output
+    file name, the preview data, the number of rows written and the time spent
+    per stage (generate, preview, write or archive). With profile=True it also
+    has a cProfile summary of this process; shards run on other workers are
+    only seen as time waiting for them.
+
+    The agent method's timeseries mode writes its archive window by window
+    and calls on_checkpoint(checkpoint, filename) after each one; passing a
+    checkpoint continues that run from there into a new archive. Should the
+    run stop early, the archive is kept with the windows completed so far.
+
+    Passing a StageTimer lets the caller read the timings of a failed run.
+    """
+    timer = timer or StageTimer()
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        result = _run_generation(method, rows, params, chunk_size, on_progress, tag, fmt, workers, timer,
+                                 checkpoint, on_checkpoint)
+    finally:
+        if profiler:
+            profiler.disable()
+
+    result['timings'] = timer.result()
+    if profiler:
+        result['profile'] = profile_summary(profiler)
+    return result
+
+
+def _run_generation(method, rows, params, chunk_size, on_progress, tag, fmt, workers, timer, checkpoint=None,
+                    on_checkpoint=None):
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    suffix = f"{timestamp}_{tag}" if tag else timestamp
+    generator = get_generator(method)
+    ext = FORMATS[fmt]
+    map_shards = shard_mapper(method, workers)
+
+    stats = preview_stats(method, params)
+
+    if method in ('rule', 'statistical', 'model', 'schema'):
+        prefix = {'rule': 'rule_based', 'statistical': 'statistical', 'model': 'neo_data', 'schema': 'schema_based'}[method]
+        filename = f"{prefix}_{suffix}{ext}"
+        filepath = os.path.join(OUTPUT_DIR, filename)
+
+        if method == 'model':
+            # Accepted vs. sampled rows, for class-filtered requests
+            sampling = {}
+            chunks = generator.iter_chunks(rows, params, chunk_size, map_shards, stats=sampling)
+        else:
+            chunks = generator.iter_chunks(rows, params, chunk_size, map_shards)
+        try:
+            rows_done = _write_table(
+                chunks,
+                filepath,
+                fmt,
+                stats.update,
+                on_progress,
+                timer
+            )
+        except BaseException:
+            _remove_quietly(filepath)
+            raise
+
+    elif method == 'agent':
+        files = _archive_entries(suffix, ext)
+        filename = f'ed_simulation_{suffix}.zip'
+        zip_filepath = os.path.join(OUTPUT_DIR, filename)
+
+        windowed = generator.windowed(params)
+        # Patients written before the checkpoint count towards progress
+        rows_done = checkpoint['rows_done'] if checkpoint else 0
+        windows_done = 0
+
+        def on_window(window_checkpoint):
+            nonlocal windows_done
+            windows_done += 1
+            if on_checkpoint:
+                on_checkpoint(window_checkpoint, filename)
+
+        try:
+            with ZipFile(zip_filepath, 'w', _archive_compression(fmt)) as zipf:
+                chunks = timer.timed(generator.iter_chunks(rows, params, chunk_size, map_shards, checkpoint),
+                                     'generate')
+                if windowed:
+                    written = _write_windowed_archive(zipf, chunks, fmt, suffix, ext, on_window)
+                else:
+                    written = _write_archive(zipf, chunks, fmt, files)
+                for item in timer.timed(written, 'archive'):
+                    if item is None:
+                        continue
+                    table, chunk = item
+                    timer.count(table, len(chunk))
+                    with timer.stage('preview'):
+                        stats.update(chunk, table)
+                    if table == 'patients':
+                        rows_done += len(chunk)
+                        if on_progress:
+                            on_progress(rows_done)
+        except BaseException:
+            if not windows_done:
+                _remove_quietly(zip_filepath)
+            raise
+
+    else:
+        raise ValueError(f"Invalid method: {method}")
+
+    result = {
+        'file': filename,
+        'preview_data': stats.result(),
+        'rows': rows_done
+    }
+    if method == 'model':
+        result['sampling'] = sampling
+    return result
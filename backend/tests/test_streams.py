@@ -0,0 +1,62 @@
+import os
+import pickle
+import sys
+import time
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.stub_model import StubNEOModel
+
+MODEL_REQUEST = {'rows': 2500, 'chunkSize': 1000, 'format': 'csv',
+                 'params': {'seed': 7, 'model': 'stub', 'objectType': 'hazardous'}}
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    root = tmp_path_factory.mktemp('backend')
+    stub_path = root / 'stub_model.pkl'
+    with open(stub_path, 'wb') as f:
+        pickle.dump(StubNEOModel(), f)
+    # config is read on import, and job workers load models from MODEL_PATHS
+    os.environ.update({
+        'OUTPUT_DIR': str(root / 'generated_data'),
+        'JOB_DIR': str(root / 'job_data'),
+        'RESULT_CACHE_DIR': str(root / 'result_cache'),
+        'MODEL_PATHS': f'stub={stub_path}',
+        'JOB_WORKERS': '1',
+    })
+    os.makedirs(os.environ['OUTPUT_DIR'])
+    import app
+    yield app
+    app.job_queue.executor.shutdown(cancel_futures=True)
+
+
+def _stream(client, request):
+    response = client.post('/generate/model', json={**request, 'stream': True})
+    assert response.status_code == 200
+    return response.get_data()
+
+
+def _job_output(app_module, client, request):
+    response = client.post('/generate/model', json=request)
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    deadline = time.time() + 60
+    while True:
+        job = client.get(f'/jobs/{job_id}').get_json()
+        if job['status'] in ('completed', 'failed', 'cancelled') or time.time() > deadline:
+            break
+        time.sleep(0.1)
+    assert job['status'] == 'completed', job
+    with open(os.path.join(app_module.OUTPUT_DIR, job['file']), 'rb') as f:
+        return f.read()
+
+
+def test_seeded_model_streams_are_reproducible(app_module):
+    client = app_module.app.test_client()
+    first = _stream(client, MODEL_REQUEST)
+    assert first == _stream(client, MODEL_REQUEST)
+    assert first == _job_output(app_module, client, MODEL_REQUEST)
@@ -0,0 +1,207 @@
+import gzip
+import io
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+
+# Output format -> file extension
+FORMATS = {
+    'csv': '.csv',
+    'csv.gz': '.csv.gz',
+    'csv.zst': '.csv.zst',
+    'ndjson': '.ndjson',
+    'parquet': '.parquet',
+    'feather': '.feather',
+}
+
+
+# DataFrame.attrs key of the integer ID columns that are formatted only when
+# written: {column: (prefix, width)}, e.g. ('P', 4) writes 17 as "P0017"
+ID_FORMATS = 'id_formats'
+
+
+def validate_format(fmt: str) -> str:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt} (expected one of {', '.join(FORMATS)})")
+    return fmt
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet and Feather output require the 'pyarrow' package")
+    return pyarrow
+
+
+def _format_id_array(numbers, prefix: str, width: int):
+    """Zero-padded, prefixed ID strings as an Arrow array, or a numpy array without pyarrow."""
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        return np.array([f"{prefix}{number:0{width}d}" for number in np.asarray(numbers).tolist()], dtype=object)
+    if not isinstance(numbers, (pa.Array, pa.ChunkedArray)):
+        numbers = pa.array(numbers)
+    digits = pc.utf8_lpad(pc.cast(numbers, pa.string()), width, '0')
+    return pc.binary_join_element_wise(prefix, digits, '')
+
+
+def format_ids(df: pd.DataFrame) -> pd.DataFrame:
+    """df with its ID_FORMATS columns formatted as strings; df itself is left as it is."""
+    id_formats = df.attrs.get(ID_FORMATS)
+    if not id_formats:
+        return df
+    formatted = df.copy(deep=False)
+    for column, (prefix, width) in id_formats.items():
+        ids = _format_id_array(df[column].to_numpy(), prefix, width)
+        formatted[column] = ids if isinstance(ids, np.ndarray) else ids.to_numpy(zero_copy_only=False)
+    formatted.attrs = {}
+    return formatted
+
+
+class _CountingSink(io.RawIOBase):
+    """
+    Write-only wrapper that tracks its own position, so any forward-only
+    stream (an open zip entry, a socket buffer) can be handed to writers
+    that ask for tell().
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.raw.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        self.raw.flush()
+
+    def close(self):
+        # The underlying stream belongs to the caller
+        super().close()
+
+
+class TableWriter:
+    """
+    Appends DataFrame chunks to a binary stream in one of FORMATS.
+
+    CSV variants write the header once; NDJSON writes one JSON object per
+    row (dates as ISO 8601); Parquet writes one row group per
+    chunk and Feather (Arrow IPC file) one record batch per chunk, both
+    using the schema of the first chunk. Categorical columns are written
+    as Arrow dictionaries, and ID_FORMATS columns as formatted strings.
+    close() finishes the format's trailer (gzip/zstd frame, Parquet footer)
+    but leaves the stream open.
+    """
+
+    def __init__(self, fileobj, fmt: str = 'csv'):
+        self.fmt = validate_format(fmt)
+        self.sink = _CountingSink(fileobj)
+        self.rows = 0
+        self._header = True
+        self._text = None
+        self._compressor = None
+        self._arrow_writer = None
+        self._schema = None
+
+        if fmt in ('csv', 'ndjson'):
+            self._text = io.TextIOWrapper(self.sink, encoding='utf-8', newline='', write_through=True)
+        elif fmt == 'csv.gz':
+            self._compressor = gzip.GzipFile(fileobj=self.sink, mode='wb')
+            self._text = io.TextIOWrapper(self._compressor, encoding='utf-8', newline='', write_through=True)
+        elif fmt == 'csv.zst':
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("csv.zst output requires the 'zstandard' package")
+            self._compressor = zstandard.ZstdCompressor().stream_writer(self.sink, closefd=False)
+            self._text = io.TextIOWrapper(self._compressor, encoding='utf-8', newline='', write_through=True)
+        else:
+            _require_pyarrow()
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self._text is None:
+            self._write_arrow(df)
+        elif self.fmt == 'ndjson':
+            if len(df):
+                lines = format_ids(df).to_json(orient='records', lines=True, date_format='iso')
+                self._text.write(lines if lines.endswith('\n') else lines + '\n')
+        elif self._text is not None:
+            df = format_ids(df)
+            df.to_csv(self._text, index=False, header=self._header)
+            self._header = False
+        self.rows += len(df)
+
+    def _write_arrow(self, df):
+        pa = _require_pyarrow()
+        id_formats = df.attrs.get(ID_FORMATS) or {}
+        if df.attrs:
+            # pyarrow would keep attrs in the file, and the IDs are formatted by then
+            df = df.copy(deep=False)
+            df.attrs = {}
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # Formatted straight into Arrow strings, without Python objects
+        for column, (prefix, width) in id_formats.items():
+            i = table.schema.get_field_index(column)
+            table = table.set_column(i, column, _format_id_array(table.column(i), prefix, width))
+        if self._arrow_writer is None:
+            self._open_arrow(table.schema)
+        elif not table.schema.equals(self._schema):
+            table = table.cast(self._schema)
+        self._arrow_writer.write_table(table)
+
+    def _open_arrow(self, schema):
+        pa = _require_pyarrow()
+        self._schema = schema
+        if self.fmt == 'parquet':
+            self._arrow_writer = pa.parquet.ParquetWriter(self.sink, schema, compression='snappy')
+        else:
+            self._arrow_writer = pa.ipc.new_file(self.sink, schema)
+
+    def close(self) -> None:
+        if self._text is not None:
+            self._text.flush()
+            self._text.detach()
+            if self._compressor is not None:
+                self._compressor.close()
+        else:
+            if self._arrow_writer is None:
+                # No chunks: still a valid file, with no columns
+                self._open_arrow(_require_pyarrow().schema([]))
+            self._arrow_writer.close()
+        self.sink.flush()
+
+
+def iter_encoded(chunks, fmt: str = 'csv') -> Iterator[bytes]:
+    """Encode DataFrame chunks in the given format, yielding bytes as each chunk is written."""
+    buffer = io.BytesIO()
+    writer = TableWriter(buffer, fmt)
+
+    def drain():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    for chunk in chunks:
+        writer.write(chunk)
+        data = drain()
+        if data:
+            yield data
+    writer.close()
+    data = drain()
+    if data:
+        yield data
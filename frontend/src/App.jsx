@@ -59,13 +59,8 @@ function App() {
             setGeneratedFile(null);
             setPreviewData(null);
             
-            const progressInterval = setInterval(() => {
-                setProgress(prev => Math.min(prev + 10, 90));
-            }, 200);
+            const result = await generateData(selectedMethod, rows, params, setProgress);
             
-            const result = await generateData(selectedMethod, rows, params);
-            
-            clearInterval(progressInterval);
             setProgress(100);
             setGeneratedFile(result.file);
             setPreviewData(result.preview_data);
@@ -1,19 +1,35 @@
 import axios from 'axios';
 
 const API_URL = 'http://localhost:5000';
+const POLL_INTERVAL_MS = 500;
 
-export const generateData = async (method, rows, params = {}) => {
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+export const generateData = async (method, rows, params = {}, onProgress = () => {}) => {
     try {
         const response = await axios.post(`${API_URL}/generate/${method}`, {
             rows,
             params
         });
-        return response.data;
+        const jobId = response.data.job_id;
+
+        // Generation runs as a background job; poll until it finishes
+        while (true) {
+            const { data: job } = await axios.get(`${API_URL}/jobs/${jobId}`);
+            onProgress(Math.round(job.progress * 100));
+            if (job.status === 'completed') {
+                return job;
+            }
+            if (job.status === 'failed' || job.status === 'cancelled') {
+                throw new Error(job.error || `Job ${job.status}`);
+            }
+            await sleep(POLL_INTERVAL_MS);
+        }
     } catch (error) {
-        throw error.response?.data?.error || 'An error occurred';
+        throw error.response?.data?.error || error.message || 'An error occurred';
     }
 };
 
 export const downloadFile = (filename) => {
-    window.open(`${API_URL}/static/generated_data/${filename}`);
-};
\ No newline at end of file
+    window.open(`${API_URL}/download/${filename}`);
+};